@@ -1,6 +1,20 @@
 import os
+import sys
+import json
+import hashlib
+import threading
+import uuid
+import bisect
+import re
+import math
+import heapq
+import queue
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import tkinter as tk
 from tkinter import simpledialog, messagebox, filedialog, ttk
+from tkinter import font as tkfont
 import datetime
 try:
     from PIL import Image, ImageTk  # 用于图片预览
@@ -15,12 +29,50 @@ WINDOW_CONFIG_FILE = "window_config.txt"  # 主窗口配置文件路径
 DETAIL_WINDOW_CONFIG_FILE = "detail_window_config.txt"  # 详情窗口配置文件路径
 HIDE_STATE_FILE = "hide_state_config.txt"  # 隐藏状态配置文件路径
 PROJECTS_ROOT = "项目文件夹"  # 项目文件夹根目录
+TODO_JOURNAL_FILE = "todo_data_ui.journal"  # 待办增量日志文件路径
+JOURNAL_MODE = True  # 是否启用增量日志（关闭后每次修改都整体重写数据文件）
+JOURNAL_COMPACT_THRESHOLD = 500  # 日志累计记录数达到该值后在后台合并到数据文件
+STORAGE_BACKEND = "text"  # 存储后端："text"（文本文件+增量日志）或 "sqlite"
+SQLITE_DB_FILE = "todo_data.db"  # SQLite数据库文件路径
+HIDE_STATE_FLUSH_DELAY = 1000  # 隐藏状态修改后延迟多少毫秒批量写盘
+SEARCH_DELAY = 200  # 搜索框输入停顿多少毫秒后执行搜索
+SEARCH_TITLE_WEIGHT = 3  # 标题中的词在搜索排序中相对事项日志的权重
+SEARCH_RESULT_LIMIT = 1000  # 主界面最多显示多少条搜索结果
+THUMBNAIL_WORKERS = 4  # 后台解码缩略图的线程数
+IMAGE_THUMBNAIL_SIZE = (100, 100)  # 图片附件缩略图尺寸
+VIDEO_THUMBNAIL_SIZE = (120, 120)  # 视频附件缩略图尺寸
+FFMPEG_BIN = "ffmpeg"  # ffmpeg可执行文件
+VIDEO_THUMBNAIL_WORKERS = 2  # 同时运行的ffmpeg进程数
+VIDEO_THUMBNAIL_TIMEOUT = 30  # 单个视频提取缩略图的超时时间（秒）
+VIDEO_EXTRACT_MODE = "fast"  # 视频截图方式："fast"（输入前定位到关键帧并在ffmpeg中缩放）或 "accurate"（逐帧解码到指定时间）
+VIDEO_EXTRACT_PIPE = False  # fast模式下是否通过标准输出传回BMP帧，而不是让ffmpeg写JPEG文件
+FFPROBE_BIN = "ffprobe"  # ffprobe可执行文件（读取视频时长）
+VIDEO_STORYBOARD_MODE = False  # 是否为视频生成多帧预览图（鼠标在视频缩略图上移动时切换画面）
+VIDEO_STORYBOARD_FRAMES = 9  # 多帧预览图的帧数
+THUMBNAIL_DECODE_MODE = "fast"  # 缩略图解码模式："fast"（最快）、"balanced"（Pillow默认）、"quality"（完整解码）
+THUMBNAIL_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".todo_thumbs")  # 缩略图磁盘缓存目录
+THUMBNAIL_CACHE_MAX_BYTES = 200 * 1024 * 1024  # 缩略图磁盘缓存的容量上限（字节）
+VIDEO_THUMBNAIL_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".todo_video_thumbs")  # 视频截图缓存目录
+VIDEO_THUMBNAIL_CACHE_MAX_BYTES = 100 * 1024 * 1024  # 视频截图缓存的容量上限（字节）
+STAT_CACHE_TTL = 5  # 目录文件状态缓存的有效期（秒）
+THUMBNAIL_SWEEP_DELAY = 10000  # 启动后延迟多少毫秒在后台清理不再引用的缩略图缓存
+PHOTO_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 内存中缩略图位图（PhotoImage）的容量上限（字节）
+IMPORT_CHUNK_SIZE = 4 * 1024 * 1024  # 导入附件时每次复制的块大小（字节）
+MIGRATION_WORKERS = 4  # 迁移附件到项目文件夹时同时复制的文件数
+ATTACH_MODE = "auto"  # 添加附件的方式："copy"（复制）、"reflink"（写时复制克隆）、"hardlink"（硬链接）、"move"（移动）、"reference"（不复制，直接引用原文件）、"auto"（能克隆就克隆，否则复制）
+BLOB_STORE_MODE = False  # 是否按内容去重保存附件（相同内容只存一份，项目文件夹中为硬链接或直接引用）
+BLOB_STORE_DIR = os.path.join(PROJECTS_ROOT, ".blobs")  # 按内容哈希命名的附件存储目录
+BLOB_INDEX_FLUSH_DELAY = 1000  # 附件存储索引修改后延迟多少毫秒批量写盘
 
 # ========================== 全局变量 ==========================
-todo_list = []  # 全局待办列表
-task_text_widget = None  # 全局任务显示文本框
+todo_list = []  # 全局待办列表（Task对象）
+tasks_by_id = {}  # 任务ID -> Task，按ID查找任务
+task_list_view = None  # 全局任务列表视图（VirtualTaskList）
+task_count_label = None  # 全局任务计数标签
 root_window = None  # 全局主窗口
 hide_completed = False  # 是否隐藏已完成任务
+search_query = ""  # 当前搜索词（为空时显示全部任务）
+search_match_count = 0  # 当前搜索匹配的任务总数
 
 # ========================== 工具函数 ==========================
 def darken_color(hex_color, percent=10):
@@ -36,36 +88,951 @@ def darken_color(hex_color, percent=10):
     
     return f"#{r:02x}{g:02x}{b:02x}"
 
+# ========================== 任务数据模型 ==========================
+TASK_FIELD_COUNT = 8  # 文本格式字段数：标题|状态|批注|图片列表|视频列表|文件列表|项目文件夹路径|任务ID
+
+_TASK_ID_RE = re.compile(r"[0-9a-fA-F]{32}")
+# 当前格式的行对字段中的反斜杠、分隔符和换行转义；没有任务ID的旧数据行未转义，按原样切分
+_TASK_FIELD_ESCAPES = str.maketrans({"\\": "\\\\", "|": "\\|", "\n": "\\n", "\r": "\\r"})
+_TASK_FIELD_UNESCAPES = {"\\\\": "\\", "\\|": "|", "\\n": "\n", "\\r": "\r"}
+_TASK_LINE_TOKEN_RE = re.compile(r"\\.|\|")
+
+def is_current_task_line(line):
+    """判断数据行是否为带任务ID的当前格式（最后一个字段是任务ID）"""
+    return len(line) > 32 and line[-33] == "|" and _TASK_ID_RE.fullmatch(line[-32:]) is not None
+
+def split_task_line(line):
+    """按未转义的分隔符切分当前格式的数据行，并还原各字段中的转义字符"""
+    fields = []
+    current = []
+    pos = 0
+    for match in _TASK_LINE_TOKEN_RE.finditer(line):
+        current.append(line[pos:match.start()])
+        token = match.group()
+        if token == "|":
+            fields.append("".join(current))
+            current = []
+        else:
+            current.append(_TASK_FIELD_UNESCAPES.get(token, token))
+        pos = match.end()
+    current.append(line[pos:])
+    fields.append("".join(current))
+    return fields
+
+def new_task_id():
+    """生成新的任务ID（创建后不再改变）"""
+    return uuid.uuid4().hex
+
+class Task:
+    """待办任务的内存记录，只在读写数据文件时与管道分隔的文本行互相转换"""
+    __slots__ = ("id", "title", "completed", "comment", "img_paths", "video_paths", "file_paths", "project_path")
+
+    def __init__(self, title="", completed=False, comment="", img_paths=None, video_paths=None,
+                 file_paths=None, project_path="", id=None):
+        self.id = id or new_task_id()
+        self.title = title
+        self.completed = completed
+        self.comment = comment
+        self.img_paths = img_paths if img_paths is not None else []
+        self.video_paths = video_paths if video_paths is not None else []
+        self.file_paths = file_paths if file_paths is not None else []
+        self.project_path = project_path
+
+    @classmethod
+    def from_line(cls, line):
+        """从数据文件的一行解析任务"""
+        # 8个字段：标题|状态|批注|图片列表|视频列表|文件列表|项目文件夹路径|任务ID
+        # 图片、视频、文件字段使用分号分隔多个路径；旧数据没有任务ID，读取时自动分配
+        if is_current_task_line(line):
+            parts = split_task_line(line)
+        else:
+            parts = line.split("|")[:TASK_FIELD_COUNT - 1]
+        parts = parts + [""] * (TASK_FIELD_COUNT - len(parts))
+        return cls(title=parts[0],
+                   completed=parts[1] == "True",
+                   comment=parts[2],
+                   img_paths=parse_path_list(parts[3]),
+                   video_paths=parse_path_list(parts[4]),
+                   file_paths=parse_path_list(parts[5]),
+                   project_path=parts[6],
+                   id=parts[7].strip() or None)
+
+    def to_line(self):
+        """转换为数据文件中的一行（字段中的分隔符和换行会被转义）"""
+        return "|".join(field.translate(_TASK_FIELD_ESCAPES) for field in [
+            self.title,
+            "True" if self.completed else "False",
+            self.comment,
+            join_path_list(self.img_paths),
+            join_path_list(self.video_paths),
+            join_path_list(self.file_paths),
+            self.project_path or "",
+            self.id,
+        ])
+
+class StatusIndex:
+    """按完成状态划分的两个有序任务集合（保持任务在列表中的先后顺序）
+
+    每个任务分配一个递增的顺序号，两个集合各自保存有序的顺序号列表，
+    切换状态时用二分查找在两个列表间移动，不需要扫描全部任务。
+    """
+
+    def __init__(self):
+        self.rebuild([])
+
+    def rebuild(self, tasks):
+        """根据任务列表重建索引"""
+        self._order = {}  # 任务ID -> 顺序号
+        self._status = {}  # 任务ID -> 索引中记录的完成状态
+        self._keys = {True: [], False: []}  # 完成状态 -> 有序的顺序号列表
+        self._tasks = {}  # 顺序号 -> Task
+        self._next_key = 0
+        for task in tasks:
+            self.add(task)
+
+    def add(self, task):
+        """添加任务（新任务总是排在最后）"""
+        key = self._next_key
+        self._next_key += 1
+        self._order[task.id] = key
+        self._status[task.id] = task.completed
+        self._keys[task.completed].append(key)
+        self._tasks[key] = task
+
+    def remove(self, task):
+        key = self._order.pop(task.id, None)
+        if key is None:
+            return
+        keys = self._keys[self._status.pop(task.id)]
+        del keys[bisect.bisect_left(keys, key)]
+        del self._tasks[key]
+
+    def update(self, task):
+        """任务完成状态变化后，把它移到另一个集合"""
+        old_status = self._status.get(task.id)
+        if old_status is None or old_status == task.completed:
+            return
+        key = self._order[task.id]
+        old_keys = self._keys[old_status]
+        del old_keys[bisect.bisect_left(old_keys, key)]
+        bisect.insort(self._keys[task.completed], key)
+        self._status[task.id] = task.completed
+
+    def rank(self, task, completed):
+        """任务在某一状态集合中的行号；任务不在该集合中时为它应插入的位置"""
+        return bisect.bisect_left(self._keys[completed], self._order[task.id])
+
+    def position(self, task):
+        """任务在整个任务列表中的位置：两个集合中排在它前面的任务数之和（两次二分查找）"""
+        key = self._order[task.id]
+        return bisect.bisect_left(self._keys[True], key) + bisect.bisect_left(self._keys[False], key)
+
+    def sort_key(self, task_id):
+        """任务在列表中先后顺序的排序键"""
+        return self._order[task_id]
+
+    def count(self, completed):
+        """某一状态的任务数"""
+        return len(self._keys[completed])
+
+    def view(self, completed):
+        """某一状态的任务的有序只读序列（随索引实时变化）"""
+        return StatusIndexView(self, completed)
+
+class StatusIndexView:
+    """StatusIndex 中某一状态任务的只读序列视图，支持 len、下标访问和按任务查行号"""
+
+    def __init__(self, status_index, completed):
+        self._index = status_index
+        self._completed = completed
+
+    def __len__(self):
+        return len(self._index._keys[self._completed])
+
+    def __getitem__(self, row):
+        return self._index._tasks[self._index._keys[self._completed][row]]
+
+    def __iter__(self):
+        for key in list(self._index._keys[self._completed]):
+            yield self._index._tasks[key]
+
+    def __contains__(self, task):
+        return self._index._status.get(task.id) == self._completed
+
+    def index(self, task):
+        """任务在该序列中的行号（二分查找）"""
+        if task not in self:
+            raise ValueError("任务不在该状态集合中")
+        return self._index.rank(task, self._completed)
+
+status_index = StatusIndex()  # 全局任务状态索引
+
+def rebuild_task_index():
+    """根据任务列表重建 任务ID -> Task 索引和状态索引"""
+    global tasks_by_id
+    tasks_by_id = {task.id: task for task in todo_list}
+    status_index.rebuild(todo_list)
+    search_index.start_build(todo_list, on_search_index_ready)
+
+def on_search_index_ready():
+    """搜索索引建好后，如果正在搜索则刷新结果"""
+    if search_query:
+        update_main_ui()
+
+def get_task(task_id):
+    """按任务ID查找任务，不存在时返回None"""
+    return tasks_by_id.get(task_id)
+
+# -------------------------- 任务变更通知 --------------------------
+# 任务的新增、修改、删除都会通知订阅者：callback(event, task, fields)
+#   event 为 "inserted" / "updated" / "removing" / "removed"，fields 为修改的字段（仅 "updated" 时有值）
+#   删除任务时先发送 "removing"（任务仍在列表和索引中），移除后再发送 "removed"
+_task_change_listeners = []
+
+def subscribe_task_changes(callback):
+    """订阅任务变更通知"""
+    _task_change_listeners.append(callback)
+
+def notify_task_change(event, task, fields=()):
+    """通知所有订阅者某个任务发生了变化"""
+    for callback in list(_task_change_listeners):
+        try:
+            callback(event, task, fields)
+        except Exception as e:
+            print(f"处理任务变更通知失败: {e}")
+
+def insert_task(task):
+    """把新任务追加到列表末尾，保存并通知订阅者"""
+    todo_list.append(task)
+    tasks_by_id[task.id] = task
+    status_index.add(task)
+    save_task_added(task)
+    notify_task_change("inserted", task)
+
+def remove_task(task):
+    """从列表中删除任务，保存并通知订阅者"""
+    notify_task_change("removing", task)
+    todo_list.remove(task)
+    tasks_by_id.pop(task.id, None)
+    status_index.remove(task)
+    save_task_deleted(task)
+    notify_task_change("removed", task)
+
 def load_todo():
     """读取待办任务（增强容错）- 扩展支持多图片、多视频、多文件附件和项目文件夹路径"""
     global todo_list
     todo_list = []
-    if os.path.exists(TODO_FILE):
-        try:
-            with open(TODO_FILE, "r", encoding="utf-8") as f:
-                for line in f.readlines():
-                    line = line.strip()
-                    if not line:
-                        continue
-                    parts = line.split("|")
-                    # 扩展为7个字段：标题|状态|批注|图片列表|视频列表|文件列表|项目文件夹路径
-                    # 图片、视频、文件字段使用分号分隔多个路径
-                    task_data = parts + [""] * (7 - len(parts))
-                    todo_list.append("|".join(task_data[:7]))
-        except Exception as e:
-            messagebox.showerror("读取失败", f"加载待办数据出错：{str(e)}", parent=root_window)
+    try:
+        todo_list = get_storage().load_tasks()
+    except Exception as e:
+        messagebox.showerror("读取失败", f"加载待办数据出错：{str(e)}", parent=root_window)
+    rebuild_task_index()
 
 def save_todo():
-    """保存待办任务"""
+    """保存全部待办任务"""
     global todo_list
     try:
-        with open(TODO_FILE, "w", encoding="utf-8") as f:
-            for task in todo_list:
-                if task.strip():
-                    f.write(task + "\n")
+        get_storage().save_tasks(todo_list)
+    except Exception as e:
+        messagebox.showerror("保存失败", f"保存待办数据出错：{str(e)}", parent=root_window)
+
+def save_task_change(task, *fields):
+    """保存单个任务的部分字段修改，并通知订阅者"""
+    try:
+        get_storage().update_task(task, fields)
+    except Exception as e:
+        messagebox.showerror("保存失败", f"保存待办数据出错：{str(e)}", parent=root_window)
+    if "completed" in fields:
+        status_index.update(task)
+    notify_task_change("updated", task, fields)
+
+def save_task_added(task, index=None):
+    """保存新增的任务（调用前任务已加入列表，index 默认为列表末尾）"""
+    if index is None:
+        index = len(todo_list) - 1
+    try:
+        get_storage().add_task(index, task)
+    except Exception as e:
+        messagebox.showerror("保存失败", f"保存待办数据出错：{str(e)}", parent=root_window)
+
+def save_task_deleted(task):
+    """保存任务删除（调用前任务已从列表中移除）"""
+    try:
+        get_storage().delete_task(task)
     except Exception as e:
         messagebox.showerror("保存失败", f"保存待办数据出错：{str(e)}", parent=root_window)
 
+# ========================== 全文搜索 ==========================
+# 对标题和事项日志建立倒排索引：词 -> {任务ID: 权重}
+#   中文按相邻两字切分（单字的片段保留单字），英文和数字按单词切分并转小写
+#   加载任务后在后台线程中建立索引，之后随任务变更通知增量更新
+_CJK_CHARS = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_SEARCH_TOKEN_RE = re.compile(f"[{_CJK_CHARS}]+|[^\\W{_CJK_CHARS}]+")
+
+def tokenize_search_text(text):
+    """把文本切分为搜索用的词列表"""
+    tokens = []
+    for run in _SEARCH_TOKEN_RE.findall(text or ""):
+        if "\u3400" <= run[0] <= "\ufaff":
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+def _is_cjk_token(token):
+    return "\u3400" <= token[0] <= "\ufaff"
+
+class SearchIndex:
+    """任务标题和事项日志的倒排索引"""
+
+    def __init__(self):
+        self._generation = 0
+        self.reset()
+
+    def reset(self):
+        """清空索引（之后需调用 start_build() 重新建立）"""
+        self._generation += 1  # 使正在进行的后台建立作废
+        self._postings = {}  # 词 -> {任务ID: 权重}
+        self._doc_terms = {}  # 任务ID -> {词: 权重}，用于更新和删除
+        self._sorted_terms = []  # 按字母排序的非中文词表（前缀匹配用）
+        self._char_terms = {}  # 汉字 -> 包含该字的中文词集合（单字查询用）
+        self._pending = {}  # 建立索引期间发生变更的任务：任务ID -> Task
+        self.ready = False
+
+    def start_build(self, tasks, on_ready=None):
+        """在后台线程中为 tasks 建立索引（在界面线程中调用）
+
+        建立期间 search() 返回 None，变更的任务先记录下来，建好后在界面线程中补上，再调用 on_ready()。
+        """
+        self.reset()
+        generation = self._generation
+        docs = [(task.id, task.title, task.comment) for task in tasks]
+        result = queue.Queue()
+
+        def worker():
+            try:
+                built = SearchIndex()
+                for task_id, title, comment in docs:
+                    built._add_terms(task_id, self._text_terms(title, comment))
+                result.put(built)
+            except Exception as e:
+                print(f"建立搜索索引失败: {e}")
+                result.put(None)
+
+        def poll():
+            if generation != self._generation:
+                return
+            try:
+                built = result.get_nowait()
+            except queue.Empty:
+                root_window.after(100, poll)
+                return
+            if built is None:
+                return
+            self._postings, self._doc_terms = built._postings, built._doc_terms
+            self._sorted_terms, self._char_terms = built._sorted_terms, built._char_terms
+            self.ready = True
+            pending, self._pending = self._pending, {}
+            for task_id, task in pending.items():
+                self.remove(task)
+                if get_task(task_id) is task:
+                    self.add(task)
+            if on_ready:
+                on_ready()
+
+        threading.Thread(target=worker, name="search-index", daemon=True).start()
+        root_window.after(100, poll)
+
+    @staticmethod
+    def _text_terms(title, comment):
+        terms = {}
+        for token in tokenize_search_text(title):
+            terms[token] = terms.get(token, 0) + SEARCH_TITLE_WEIGHT
+        for token in tokenize_search_text(comment):
+            terms[token] = terms.get(token, 0) + 1
+        return terms
+
+    def _add_terms(self, task_id, terms):
+        self._doc_terms[task_id] = terms
+        for term, weight in terms.items():
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = {}
+                if _is_cjk_token(term):
+                    for char in set(term):
+                        self._char_terms.setdefault(char, set()).add(term)
+                else:
+                    bisect.insort(self._sorted_terms, term)
+            posting[task_id] = weight
+
+    def _drop_term(self, term):
+        del self._postings[term]
+        if _is_cjk_token(term):
+            for char in set(term):
+                terms = self._char_terms.get(char)
+                if terms is not None:
+                    terms.discard(term)
+                    if not terms:
+                        del self._char_terms[char]
+        else:
+            i = bisect.bisect_left(self._sorted_terms, term)
+            if i < len(self._sorted_terms) and self._sorted_terms[i] == term:
+                del self._sorted_terms[i]
+
+    def add(self, task):
+        """把任务加入索引"""
+        if not self.ready:
+            self._pending[task.id] = task
+            return
+        self._add_terms(task.id, self._text_terms(task.title, task.comment))
+
+    def remove(self, task):
+        """把任务移出索引"""
+        if not self.ready:
+            self._pending[task.id] = task
+            return
+        terms = self._doc_terms.pop(task.id, None)
+        if not terms:
+            return
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(task.id, None)
+            if not posting:
+                self._drop_term(term)
+
+    def update(self, task):
+        """任务标题或事项日志修改后重新索引"""
+        self.remove(task)
+        self.add(task)
+
+    def on_task_change(self, event, task, fields):
+        """任务变更通知的回调"""
+        if event == "inserted":
+            self.add(task)
+        elif event == "removed":
+            self.remove(task)
+        elif event == "updated" and ("title" in fields or "comment" in fields):
+            self.update(task)
+
+    def _expand_term(self, token, is_last):
+        """查询词对应的索引词列表
+
+        单个汉字匹配所有包含该字的词；正在输入的最后一个英文单词按前缀匹配。
+        """
+        if _is_cjk_token(token) and len(token) == 1:
+            return list(self._char_terms.get(token, ()))
+        if is_last and not _is_cjk_token(token):
+            terms = []
+            i = bisect.bisect_left(self._sorted_terms, token)
+            while i < len(self._sorted_terms) and self._sorted_terms[i].startswith(token):
+                terms.append(self._sorted_terms[i])
+                i += 1
+            return terms
+        return [token] if token in self._postings else []
+
+    def search(self, query, limit=None, exclude_completed=False):
+        """搜索包含全部查询词的任务（exclude_completed 为真时跳过已完成任务）
+
+        返回 (按相关度从高到低排列的前 limit 个Task, 匹配的任务总数)；索引尚未建好时返回 (None, 0)
+        """
+        if not self.ready:
+            return None, 0
+        tokens = list(dict.fromkeys(tokenize_search_text(query)))
+        if not tokens:
+            return [], 0
+        # 每个查询词对应若干索引词，先用任务ID集合求交集（从最小的集合开始）
+        groups = []
+        for i, token in enumerate(tokens):
+            postings = [self._postings[term] for term in self._expand_term(token, i == len(tokens) - 1)]
+            if not postings:
+                return [], 0
+            if len(postings) == 1:
+                ids = postings[0].keys()
+            else:
+                ids = set().union(*postings)
+            groups.append((len(ids), ids, postings))
+        groups.sort(key=lambda group: group[0])
+        candidates = set(groups[0][1])
+        for _, ids, _ in groups[1:]:
+            candidates.intersection_update(ids)
+            if not candidates:
+                return [], 0
+        if exclude_completed:
+            candidates = {task_id for task_id in candidates if not tasks_by_id[task_id].completed}
+        # 只为候选任务计算得分：权重乘以逆文档频率
+        total = max(1, len(self._doc_terms))
+        scores = dict.fromkeys(candidates, 0.0)
+        for _, _, postings in groups:
+            for posting in postings:
+                idf = math.log(1 + total / len(posting))
+                if len(posting) <= len(candidates):
+                    for task_id, weight in posting.items():
+                        if task_id in scores:
+                            scores[task_id] += weight * idf
+                else:
+                    for task_id in candidates:
+                        weight = posting.get(task_id)
+                        if weight:
+                            scores[task_id] += weight * idf
+        # 只对得分最高的 limit 个任务排序，同分时保持列表顺序
+        def rank_key(task_id):
+            return (-scores[task_id], status_index.sort_key(task_id))
+        if limit is not None and len(scores) > limit:
+            top_ids = heapq.nsmallest(limit, scores, key=rank_key)
+        else:
+            top_ids = sorted(scores, key=rank_key)
+        return [tasks_by_id[task_id] for task_id in top_ids], len(scores)
+
+search_index = SearchIndex()  # 全局全文搜索索引
+subscribe_task_changes(search_index.on_task_change)
+
+# ========================== 数据存储层 ==========================
+# 所有持久化都通过存储后端完成，后端需实现：
+#   load_tasks() / save_tasks(tasks)                     读取/整体保存任务列表
+#   add_task(index, task) / update_task(task, fields) / delete_task(task)
+#   load_all_hide_states() / save_hide_states(all_hide_states, task_ids)
+#   get_setting(key) / set_setting(key, value)           窗口尺寸等配置
+_storage = None  # 当前使用的存储后端
+
+def get_storage():
+    """获取（首次调用时创建）当前配置的存储后端"""
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "sqlite":
+            _storage = SqliteStorage(SQLITE_DB_FILE)
+            if _storage.get_setting("text_imported") is None and os.path.exists(TODO_FILE):
+                # 首次切换到SQLite时自动导入原有的文本数据
+                import_text_data_to_sqlite(_storage)
+        else:
+            _storage = TextStorage()
+    return _storage
+
+class TextStorage:
+    """文本文件存储：管道分隔的数据文件快照 + 追加写入的增量日志
+
+    日志文件每行一条JSON记录：
+      {"op": "add", "i": 序号, "task": {字段: 值}}   在指定位置新增任务
+      {"op": "set", "id": 任务ID, "v": {字段: 值}}   修改任务的部分字段
+      {"op": "del", "id": 任务ID}                    删除任务
+      {"op": "compact", "digest": 快照SHA1}           合并标记：该行之前的记录已写入对应快照
+    """
+
+    # 配置项对应的文本文件
+    SETTING_FILES = {
+        "window_geometry": WINDOW_CONFIG_FILE,
+        "detail_window_geometry": DETAIL_WINDOW_CONFIG_FILE,
+    }
+
+    def __init__(self):
+        self._journal_lock = threading.Lock()  # 保护日志文件的追加与截断
+        self._journal_records = 0  # 未合并的日志记录数
+        self._compact_thread = None  # 正在执行的后台合并线程
+        self._tasks = []  # 最近一次加载/保存的任务列表，用于后台合并
+        self._legacy_index_ids = None  # 旧数据按序号记录隐藏状态时，序号 -> 任务ID
+
+    # -------------------------- 任务读写 --------------------------
+    def load_tasks(self):
+        tasks = []
+        snapshot_digest = None
+        ids_assigned = False
+        if os.path.exists(TODO_FILE):
+            with open(TODO_FILE, "rb") as f:
+                data = f.read()
+            snapshot_digest = hashlib.sha1(data).hexdigest()
+            for line in data.decode("utf-8").split("\n"):
+                line = line.strip()
+                if not line:
+                    continue
+                task = Task.from_line(line)
+                if not is_current_task_line(line):
+                    ids_assigned = True
+                tasks.append(task)
+        if JOURNAL_MODE:
+            self._replay_journal(tasks, snapshot_digest)
+        self._tasks = tasks
+        if ids_assigned:
+            # 旧数据刚分配了任务ID，立即写回，保证下次启动ID不变；
+            # 按任务序号保存的隐藏状态同时改为按任务ID保存
+            self._legacy_index_ids = [task.id for task in tasks]
+            if os.path.exists(HIDE_STATE_FILE):
+                self._write_hide_states(self.load_all_hide_states())
+            self._legacy_index_ids = None
+            if JOURNAL_MODE:
+                self.compact_journal(background=False)
+            else:
+                self.save_tasks(tasks)
+        return tasks
+
+    def save_tasks(self, tasks):
+        self._tasks = tasks
+        if JOURNAL_MODE:
+            # 日志模式下数据文件只在合并日志时重写，没有未合并的修改则无需写入
+            if self._journal_records > 0:
+                self.compact_journal(background=False)
+            return
+        with open(TODO_FILE, "w", encoding="utf-8") as f:
+            for task in tasks:
+                line = task.to_line()
+                if line.strip():
+                    f.write(line + "\n")
+
+    def add_task(self, index, task):
+        if not JOURNAL_MODE:
+            self.save_tasks(self._tasks)
+            return
+        self._record_change({"op": "add", "i": index,
+                             "task": {field: getattr(task, field) for field in Task.__slots__}})
+
+    def update_task(self, task, fields):
+        if not JOURNAL_MODE:
+            self.save_tasks(self._tasks)
+            return
+        self._record_change({"op": "set", "id": task.id,
+                             "v": {field: getattr(task, field) for field in fields}})
+
+    def delete_task(self, task):
+        if not JOURNAL_MODE:
+            self.save_tasks(self._tasks)
+            return
+        self._record_change({"op": "del", "id": task.id})
+
+    # -------------------------- 增量日志 --------------------------
+    def _journal_append(self, record):
+        """追加一条日志记录并刷到磁盘"""
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._journal_lock:
+            with open(TODO_JOURNAL_FILE, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _record_change(self, record):
+        """记录一次修改，并在记录过多时触发后台合并"""
+        self._journal_append(record)
+        self._journal_records += 1
+        if self._journal_records >= JOURNAL_COMPACT_THRESHOLD:
+            self.compact_journal(background=True)
+
+    def _read_journal_records(self):
+        """读取日志中的全部记录，忽略崩溃时写了一半的行"""
+        records = []
+        if not os.path.exists(TODO_JOURNAL_FILE):
+            return records
+        with open(TODO_JOURNAL_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    print(f"跳过损坏的日志记录: {line[:50]}")
+        return records
+
+    def _replay_journal(self, tasks, snapshot_digest):
+        """在已加载的快照上重放日志，恢复上次退出（或崩溃）前的状态"""
+        try:
+            records = self._read_journal_records()
+        except Exception as e:
+            print(f"读取待办日志失败: {e}")
+            return
+        # 找到与当前快照匹配的最后一个合并标记，只重放其后的记录
+        start = 0
+        for i, record in enumerate(records):
+            if record.get("op") == "compact" and record.get("digest") == snapshot_digest:
+                start = i + 1
+        replayed = 0
+        by_id = {task.id: task for task in tasks}
+        for record in records[start:]:
+            try:
+                op = record.get("op")
+                if op == "add":
+                    task = Task()
+                    for field, value in record["task"].items():
+                        if field in Task.__slots__:
+                            setattr(task, field, value)
+                    tasks.insert(record["i"], task)
+                    by_id[task.id] = task
+                elif op == "set":
+                    task = by_id[record["id"]]
+                    for field, value in record["v"].items():
+                        if field in Task.__slots__ and field != "id":
+                            setattr(task, field, value)
+                elif op == "del":
+                    tasks.remove(by_id.pop(record["id"]))
+                else:
+                    continue
+                replayed += 1
+            except (KeyError, IndexError, TypeError, ValueError) as e:
+                print(f"重放日志记录失败: {e}")
+        self._journal_records = replayed
+
+    def _write_snapshot(self, data):
+        """原子地写入数据文件快照（先写临时文件再替换）"""
+        tmp_path = TODO_FILE + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, TODO_FILE)
+
+    def _truncate_journal(self, digest):
+        """删除日志中已写入快照的记录（合并标记及其之前的行）"""
+        with self._journal_lock:
+            if not os.path.exists(TODO_JOURNAL_FILE):
+                return
+            with open(TODO_JOURNAL_FILE, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+            keep_from = None
+            for i, line in enumerate(lines):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("op") == "compact" and record.get("digest") == digest:
+                    keep_from = i + 1
+            if keep_from is None:
+                return
+            tmp_path = TODO_JOURNAL_FILE + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(lines[keep_from:])
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, TODO_JOURNAL_FILE)
+
+    def compact_journal(self, background=True):
+        """把当前内存状态合并为新的数据文件快照，并清理已合并的日志
+
+        快照内容在调用线程中生成，同时写入合并标记；写文件和截断日志可在后台线程完成。
+        任一步骤中途崩溃时，load_tasks 都能根据快照摘要判断应从哪条记录开始重放。
+        """
+        running = self._compact_thread
+        if running and running.is_alive():
+            if background:
+                return
+            # 同步合并（如退出时）需等待正在进行的后台合并结束
+            running.join()
+        lines = [task.to_line() for task in self._tasks]
+        data = "".join(line + "\n" for line in lines if line.strip()).encode("utf-8")
+        digest = hashlib.sha1(data).hexdigest()
+        self._journal_append({"op": "compact", "digest": digest})
+        self._journal_records = 0
+
+        def do_compact():
+            try:
+                self._write_snapshot(data)
+                self._truncate_journal(digest)
+            except Exception as e:
+                print(f"合并待办日志失败: {e}")
+
+        if background:
+            self._compact_thread = threading.Thread(target=do_compact, daemon=True)
+            self._compact_thread.start()
+        else:
+            do_compact()
+
+    # -------------------------- 隐藏状态 --------------------------
+    def _hide_state_key(self, key):
+        """把隐藏状态文件中的键转换为任务ID（旧数据的键是任务序号）"""
+        if key.isdigit() and self._legacy_index_ids is not None:
+            idx = int(key)
+            if 0 <= idx < len(self._legacy_index_ids):
+                return self._legacy_index_ids[idx]
+        return key
+
+    def load_all_hide_states(self):
+        """读取全部隐藏状态，返回 {任务ID: 状态列表}"""
+        all_hide_states = {}
+        if os.path.exists(HIDE_STATE_FILE):
+            with open(HIDE_STATE_FILE, "r", encoding="utf-8") as f:
+                for line in f.readlines():
+                    line = line.strip()
+                    if line:
+                        parts = line.split("|")
+                        if len(parts) >= 2:
+                            task_id = self._hide_state_key(parts[0])
+                            states = parts[1].split(",")
+                            all_hide_states[task_id] = states
+        return all_hide_states
+
+    def save_hide_states(self, all_hide_states, task_ids):
+        # 文本文件只能整体重写，task_ids 仅用于判断是否有修改
+        if task_ids:
+            self._write_hide_states(all_hide_states)
+
+    def _write_hide_states(self, all_hide_states):
+        with open(HIDE_STATE_FILE, "w", encoding="utf-8") as f:
+            for key, states in all_hide_states.items():
+                states_str = ",".join(states)
+                f.write(f"{key}|{states_str}\n")
+
+    # -------------------------- 配置项 --------------------------
+    def get_setting(self, key):
+        path = self.SETTING_FILES[key]
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+
+    def set_setting(self, key, value):
+        with open(self.SETTING_FILES[key], "w", encoding="utf-8") as f:
+            f.write(value)
+
+class SqliteStorage:
+    """SQLite存储（WAL模式）：任务一行一条记录，附件存子表，单个任务的修改只写对应的行
+
+    任务以任务ID为主键，position 只用于排序且允许有空隙，删除任务不需要给其他行重新编号。
+    """
+
+    ATTACHMENT_KINDS = ("img_paths", "video_paths", "file_paths")
+    TASK_COLUMNS = ("title", "completed", "comment", "project_path")
+
+    def __init__(self, db_file):
+        import sqlite3
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                title TEXT NOT NULL DEFAULT '',
+                completed INTEGER NOT NULL DEFAULT 0,
+                comment TEXT NOT NULL DEFAULT '',
+                project_path TEXT NOT NULL DEFAULT ''
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_position ON tasks(position);
+            CREATE TABLE IF NOT EXISTS attachments (
+                task_id TEXT NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+                kind TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                path TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_attachments_task ON attachments(task_id, kind, seq);
+            CREATE TABLE IF NOT EXISTS hide_states (
+                task_id TEXT PRIMARY KEY REFERENCES tasks(id) ON DELETE CASCADE,
+                states TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        self.conn.commit()
+        self._tasks = None  # 与数据库逐行同步的任务列表
+
+    # -------------------------- 任务读写 --------------------------
+    def load_tasks(self):
+        tasks = []
+        tasks_by_id = {}
+        for row in self.conn.execute(
+                "SELECT id, title, completed, comment, project_path FROM tasks ORDER BY position"):
+            task = Task(id=row[0], title=row[1], completed=bool(row[2]), comment=row[3], project_path=row[4])
+            tasks.append(task)
+            tasks_by_id[task.id] = task
+        for task_id, kind, path in self.conn.execute(
+                "SELECT task_id, kind, path FROM attachments ORDER BY task_id, kind, seq"):
+            task = tasks_by_id.get(task_id)
+            if task is not None and kind in self.ATTACHMENT_KINDS:
+                getattr(task, kind).append(path)
+        self._tasks = tasks
+        return tasks
+
+    def save_tasks(self, tasks):
+        if tasks is self._tasks:
+            # 每次修改都已逐行写入，无需整体重写
+            return
+        self._tasks = tasks
+        with self.conn:
+            self.conn.execute("DELETE FROM tasks")
+            for position, task in enumerate(tasks):
+                self._insert_task(task, position)
+
+    def _insert_task(self, task, position):
+        self.conn.execute(
+            "INSERT INTO tasks (id, position, title, completed, comment, project_path) VALUES (?, ?, ?, ?, ?, ?)",
+            (task.id, position, task.title, int(task.completed), task.comment, task.project_path or ""))
+        for kind in self.ATTACHMENT_KINDS:
+            self._write_attachments(task.id, kind, getattr(task, kind))
+
+    def _write_attachments(self, task_id, kind, paths):
+        self.conn.execute("DELETE FROM attachments WHERE task_id = ? AND kind = ?", (task_id, kind))
+        self.conn.executemany(
+            "INSERT INTO attachments (task_id, kind, seq, path) VALUES (?, ?, ?, ?)",
+            [(task_id, kind, seq, path) for seq, path in enumerate(paths)])
+
+    def add_task(self, index, task):
+        tasks = self._tasks or []
+        with self.conn:
+            if index + 1 >= len(tasks):
+                row = self.conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM tasks").fetchone()
+                position = row[0]
+            else:
+                # 插入到中间时为其后的任务腾出位置
+                position = self.conn.execute("SELECT position FROM tasks WHERE id = ?",
+                                             (tasks[index + 1].id,)).fetchone()[0]
+                self.conn.execute("UPDATE tasks SET position = position + 1 WHERE position >= ?", (position,))
+            self._insert_task(task, position)
+
+    def update_task(self, task, fields):
+        with self.conn:
+            columns = [f for f in fields if f in self.TASK_COLUMNS]
+            if columns:
+                values = [int(task.completed) if f == "completed" else getattr(task, f) or "" for f in columns]
+                assignments = ", ".join(f"{f} = ?" for f in columns)
+                self.conn.execute(f"UPDATE tasks SET {assignments} WHERE id = ?", values + [task.id])
+            for kind in fields:
+                if kind in self.ATTACHMENT_KINDS:
+                    self._write_attachments(task.id, kind, getattr(task, kind))
+
+    def delete_task(self, task):
+        with self.conn:
+            self.conn.execute("DELETE FROM tasks WHERE id = ?", (task.id,))
+
+    # -------------------------- 隐藏状态 --------------------------
+    def load_all_hide_states(self):
+        return {task_id: states.split(",")
+                for task_id, states in self.conn.execute("SELECT task_id, states FROM hide_states")}
+
+    def save_hide_states(self, all_hide_states, task_ids):
+        # 只写入有修改的任务；已删除的任务由外键级联清理，这里跳过
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO hide_states (task_id, states) "
+                "SELECT ?, ? WHERE EXISTS (SELECT 1 FROM tasks WHERE id = ?)",
+                [(task_id, ",".join(all_hide_states[task_id]), task_id)
+                 for task_id in task_ids if task_id in all_hide_states])
+
+    # -------------------------- 配置项 --------------------------
+    def get_setting(self, key):
+        row = self.conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_setting(self, key, value):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+
+def import_text_data_to_sqlite(sqlite_storage):
+    """把文本格式的数据（任务、隐藏状态、窗口配置）一次性导入SQLite存储"""
+    text_storage = TextStorage()
+    tasks = text_storage.load_tasks()
+    sqlite_storage.save_tasks(tasks)
+    all_hide_states = text_storage.load_all_hide_states()
+    sqlite_storage.save_hide_states(all_hide_states, list(all_hide_states))
+    for key in TextStorage.SETTING_FILES:
+        value = text_storage.get_setting(key)
+        if value:
+            sqlite_storage.set_setting(key, value)
+    sqlite_storage.set_setting("text_imported", datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    print(f"已从 {TODO_FILE} 导入 {len(tasks)} 个任务到 {SQLITE_DB_FILE}")
+    return len(tasks)
+
 def save_window_config():
     """保存窗口配置（尺寸和位置）"""
     global root_window
@@ -81,8 +1048,7 @@ def save_window_config():
         # 只有在窗口已显示且尺寸有效时才保存
         if width > 50 and height > 50:
             geometry_str = f"{width}x{height}+{x}+{y}"
-            with open(WINDOW_CONFIG_FILE, "w", encoding="utf-8") as f:
-                f.write(geometry_str)
+            get_storage().set_setting("window_geometry", geometry_str)
     except Exception as e:
         # 静默失败，不影响主要功能
         pass
@@ -90,21 +1056,19 @@ def save_window_config():
 def load_window_config():
     """加载窗口配置（尺寸和位置）"""
     try:
-        if os.path.exists(WINDOW_CONFIG_FILE):
-            with open(WINDOW_CONFIG_FILE, "r", encoding="utf-8") as f:
-                geometry_str = f.read().strip()
-                # 验证格式：宽度x高度+X+Y 或 宽度x高度
-                if geometry_str:
-                    # 检查是否有位置信息
-                    if "+" in geometry_str:
-                        parts = geometry_str.split("+")
-                        if len(parts) == 3:
-                            size_part = parts[0]
-                            if "x" in size_part:
-                                return geometry_str
-                    elif "x" in geometry_str:
-                        # 只有尺寸信息
+        geometry_str = get_storage().get_setting("window_geometry")
+        # 验证格式：宽度x高度+X+Y 或 宽度x高度
+        if geometry_str:
+            # 检查是否有位置信息
+            if "+" in geometry_str:
+                parts = geometry_str.split("+")
+                if len(parts) == 3:
+                    size_part = parts[0]
+                    if "x" in size_part:
                         return geometry_str
+            elif "x" in geometry_str:
+                # 只有尺寸信息
+                return geometry_str
     except Exception as e:
         # 静默失败，返回默认值
         pass
@@ -122,8 +1086,7 @@ def save_detail_window_config(detail_win):
         # 只有在窗口已显示且尺寸有效时才保存
         if width > 50 and height > 50:
             geometry_str = f"{width}x{height}+{x}+{y}"
-            with open(DETAIL_WINDOW_CONFIG_FILE, "w", encoding="utf-8") as f:
-                f.write(geometry_str)
+            get_storage().set_setting("detail_window_geometry", geometry_str)
     except Exception as e:
         # 静默失败，不影响主要功能
         pass
@@ -131,87 +1094,154 @@ def save_detail_window_config(detail_win):
 def load_detail_window_config():
     """加载详情窗口配置（尺寸和位置）"""
     try:
-        if os.path.exists(DETAIL_WINDOW_CONFIG_FILE):
-            with open(DETAIL_WINDOW_CONFIG_FILE, "r", encoding="utf-8") as f:
-                geometry_str = f.read().strip()
-                # 验证格式：宽度x高度+X+Y 或 宽度x高度
-                if geometry_str:
-                    # 检查是否有位置信息
-                    if "+" in geometry_str:
-                        parts = geometry_str.split("+")
-                        if len(parts) == 3:
-                            size_part = parts[0]
-                            if "x" in size_part:
-                                return geometry_str
-                    elif "x" in geometry_str:
-                        # 只有尺寸信息
+        geometry_str = get_storage().get_setting("detail_window_geometry")
+        # 验证格式：宽度x高度+X+Y 或 宽度x高度
+        if geometry_str:
+            # 检查是否有位置信息
+            if "+" in geometry_str:
+                parts = geometry_str.split("+")
+                if len(parts) == 3:
+                    size_part = parts[0]
+                    if "x" in size_part:
                         return geometry_str
+            elif "x" in geometry_str:
+                # 只有尺寸信息
+                return geometry_str
     except Exception as e:
         # 静默失败，返回默认值
         pass
     return "750x900"  # 默认尺寸
 
-def save_hide_state(task_index, hide_states):
-    """保存任务的隐藏状态"""
+# -------------------------- 隐藏状态缓存 --------------------------
+# 隐藏状态表首次使用时整体读入内存，之后的读取和修改都只访问字典；
+# 修改过的任务记入 _hide_state_dirty，延迟 HIDE_STATE_FLUSH_DELAY 毫秒后批量写盘
+_hide_state_cache = None  # 任务ID -> 隐藏状态列表
+_hide_state_dirty = set()  # 尚未写盘的任务ID
+_hide_state_flush_timer = None  # 等待中的批量写盘定时器
+
+def _get_hide_state_cache():
+    """获取隐藏状态缓存（首次调用时从存储加载）"""
+    global _hide_state_cache
+    if _hide_state_cache is None:
+        try:
+            _hide_state_cache = get_storage().load_all_hide_states()
+        except Exception as e:
+            print(f"加载隐藏状态失败: {e}")
+            _hide_state_cache = {}
+    return _hide_state_cache
+
+def save_hide_state(task_id, hide_states):
+    """保存任务的隐藏状态（先写缓存，稍后批量写盘）"""
+    global _hide_state_flush_timer
+    _get_hide_state_cache()[task_id] = list(hide_states)
+    _hide_state_dirty.add(task_id)
+    if not root_window:
+        flush_hide_states()
+        return
+    # 延迟写盘，连续切换多个功能区时只写一次
+    if _hide_state_flush_timer is not None:
+        root_window.after_cancel(_hide_state_flush_timer)
+    _hide_state_flush_timer = root_window.after(HIDE_STATE_FLUSH_DELAY, flush_hide_states)
+
+def flush_hide_states():
+    """把缓存中有修改的隐藏状态写入存储"""
+    global _hide_state_flush_timer
+    _hide_state_flush_timer = None
+    if not _hide_state_dirty:
+        return
     try:
-        # 读取现有的隐藏状态
-        all_hide_states = {}
-        if os.path.exists(HIDE_STATE_FILE):
-            with open(HIDE_STATE_FILE, "r", encoding="utf-8") as f:
-                for line in f.readlines():
-                    line = line.strip()
-                    if line:
-                        parts = line.split("|")
-                        if len(parts) >= 2:
-                            idx = int(parts[0])
-                            states = parts[1].split(",")
-                            all_hide_states[idx] = states
-        
-        # 更新当前任务的隐藏状态
-        all_hide_states[task_index] = hide_states
-        
-        # 保存所有隐藏状态
-        with open(HIDE_STATE_FILE, "w", encoding="utf-8") as f:
-            for idx, states in all_hide_states.items():
-                states_str = ",".join(states)
-                f.write(f"{idx}|{states_str}\n")
+        get_storage().save_hide_states(_get_hide_state_cache(), set(_hide_state_dirty))
+        _hide_state_dirty.clear()
     except Exception as e:
         print(f"保存隐藏状态失败: {e}")
 
-def load_hide_state(task_index):
+def load_hide_state(task_id):
     """加载任务的隐藏状态"""
-    try:
-        if not os.path.exists(HIDE_STATE_FILE):
-            return ["0", "0", "0", "0"]  # 默认全部显示
-        
-        with open(HIDE_STATE_FILE, "r", encoding="utf-8") as f:
-            for line in f.readlines():
-                line = line.strip()
-                if line:
-                    parts = line.split("|")
-                    if len(parts) >= 2:
-                        idx = int(parts[0])
-                        if idx == task_index:
-                            states = parts[1].split(",")
-                            # 确保有4个状态值
-                            while len(states) < 4:
-                                states.append("0")
-                            return states[:4]
-        
-        # 如果没有找到该任务的隐藏状态，返回默认值
-        return ["0", "0", "0", "0"]
-    except Exception as e:
-        print(f"加载隐藏状态失败: {e}")
+    states = _get_hide_state_cache().get(task_id)
+    if states is None:
+        # 如果没有找到该任务的隐藏状态，返回默认值（全部显示）
         return ["0", "0", "0", "0"]
+    # 确保有4个状态值
+    states = list(states)
+    while len(states) < 4:
+        states.append("0")
+    return states[:4]
+
+# ========================== 文件状态缓存 ==========================
+class StatCache:
+    """按目录批量缓存附件文件状态
+
+    第一次查询某个目录下的文件时用一次 os.scandir 列出整个目录，之后在 ttl 秒内
+    同一目录下的文件都从缓存中查；文件大小和修改时间取自 DirEntry.stat()
+    （Windows上列目录时已一并取得，其他系统只对被查询的文件各stat一次并缓存）。
+    程序自己新增或删除文件后调用 invalidate() 使该目录的缓存失效。可在多个线程中同时使用。
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._dirs = {}  # 目录绝对路径 -> (列目录时间, {规范化文件名: DirEntry})
+        self._lock = threading.Lock()
+
+    def _listing(self, directory):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._dirs.get(directory)
+            if cached is not None and now - cached[0] < self.ttl:
+                return cached[1]
+        entries = {}
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    entries[os.path.normcase(entry.name)] = entry
+        except OSError:
+            pass
+        with self._lock:
+            self._dirs[directory] = (now, entries)
+        return entries
+
+    def stat(self, path):
+        """返回 (文件大小, 修改时间纳秒)，文件不存在时返回None"""
+        if not path:
+            return None
+        directory, name = os.path.split(os.path.abspath(path))
+        entry = self._listing(directory).get(os.path.normcase(name))
+        if entry is None:
+            return None
+        try:
+            st = entry.stat()
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def exists(self, path):
+        return self.stat(path) is not None
+
+    def getsize(self, path):
+        """文件大小，文件不存在时返回None"""
+        st = self.stat(path)
+        return st[0] if st is not None else None
+
+    def invalidate(self, path=None):
+        """使 path 所在目录以及 path 本身和其下所有目录的缓存失效；不传参数时清空全部缓存"""
+        with self._lock:
+            if path is None:
+                self._dirs.clear()
+                return
+            path = os.path.abspath(path)
+            prefix = os.path.join(path, "")
+            self._dirs.pop(os.path.dirname(path), None)
+            for directory in [d for d in self._dirs if d == path or d.startswith(prefix)]:
+                del self._dirs[directory]
 
+stat_cache = StatCache(STAT_CACHE_TTL)  # 全局附件文件状态缓存
+
+# ========================== 附件路径与视频截图 ==========================
 def parse_path_list(path_string):
     """解析路径列表字符串，返回路径列表"""
     if not path_string or not path_string.strip():
         return []
     # 使用分号分隔多个路径
-    paths = [p.strip() for p in path_string.split(";") if p.strip()]
-    # 过滤掉不存在的路径
-    return [p for p in paths if os.path.exists(p)]
+    return [p.strip() for p in path_string.split(";") if p.strip()]
 
 def join_path_list(paths):
     """将路径列表转换为字符串"""
@@ -219,8 +1249,73 @@ def join_path_list(paths):
         return ""
     return ";".join(paths)
 
-def extract_video_thumbnail(video_path, thumbnail_path=None, time_sec=1):
-    """使用ffmpeg提取视频缩略图"""
+_ffmpeg_processes = set()  # 正在运行的ffmpeg进程（退出程序时结束）
+_ffmpeg_lock = threading.Lock()
+
+def run_ffmpeg(args, timeout=None, binary=None):
+    """运行ffmpeg（binary 可换成ffprobe，不经过shell），超时后结束进程并抛出 subprocess.TimeoutExpired，
+    返回 (返回码, 标准输出)"""
+    import subprocess
+    proc = subprocess.Popen([binary or FFMPEG_BIN, "-hide_banner", "-loglevel", "error", *args],
+                            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+    with _ffmpeg_lock:
+        _ffmpeg_processes.add(proc)
+    try:
+        output, _ = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()
+        raise
+    finally:
+        with _ffmpeg_lock:
+            _ffmpeg_processes.discard(proc)
+    return proc.returncode, output
+
+def kill_running_ffmpeg():
+    """结束所有正在运行的ffmpeg进程"""
+    with _ffmpeg_lock:
+        processes = list(_ffmpeg_processes)
+    for proc in processes:
+        try:
+            proc.kill()
+        except OSError:
+            pass
+
+def build_video_extract_args(video_path, time_sec, mode, size=VIDEO_THUMBNAIL_SIZE, output="-"):
+    """生成提取一帧截图的ffmpeg参数
+
+    accurate：-ss 放在 -i 之后，ffmpeg从头解码到指定时间，输出原始分辨率JPEG
+    fast：-ss 放在 -i 之前直接定位，-noaccurate_seek 和 -skip_frame nokey 只取最近的关键帧，
+          并在ffmpeg中缩放到缩略图尺寸；output 为 "-" 时以BMP格式写到标准输出
+    """
+    if mode != "fast":
+        return ["-i", video_path, "-ss", str(time_sec), "-vframes", "1", "-q:v", "2", "-y", output]
+    args = ["-ss", str(time_sec), "-noaccurate_seek", "-skip_frame", "nokey", "-i", video_path,
+            "-frames:v", "1", "-an",
+            "-vf", f"scale={size[0]}:{size[1]}:force_original_aspect_ratio=decrease"]
+    if output == "-":
+        return args + ["-c:v", "bmp", "-f", "image2pipe", "pipe:1"]
+    return args + ["-q:v", "3", "-y", output]
+
+def _extract_video_frame(video_path, thumbnail_path, time_sec, timeout, mode, pipe):
+    """提取一帧保存到 thumbnail_path，成功返回True"""
+    if mode == "fast" and pipe:
+        returncode, output = run_ffmpeg(build_video_extract_args(video_path, time_sec, mode), timeout)
+        if returncode != 0 or not output or not Image:
+            return False
+        import io
+        with Image.open(io.BytesIO(output)) as frame:
+            frame.convert("RGB").save(thumbnail_path, "JPEG", quality=90)
+        return True
+    returncode, _ = run_ffmpeg(build_video_extract_args(video_path, time_sec, mode, output=thumbnail_path), timeout)
+    return returncode == 0 and os.path.exists(thumbnail_path)
+
+def extract_video_thumbnail(video_path, thumbnail_path=None, time_sec=1, timeout=VIDEO_THUMBNAIL_TIMEOUT,
+                            mode=None, pipe=None):
+    """使用ffmpeg提取视频缩略图（mode、pipe 默认取 VIDEO_EXTRACT_MODE、VIDEO_EXTRACT_PIPE）"""
+    mode = mode or VIDEO_EXTRACT_MODE
+    pipe = VIDEO_EXTRACT_PIPE if pipe is None else pipe
     if not thumbnail_path:
         # 生成临时缩略图路径
         import tempfile
@@ -229,261 +1324,2183 @@ def extract_video_thumbnail(video_path, thumbnail_path=None, time_sec=1):
         thumbnail_name = f"thumb_{hash(video_path)}_{video_name}.jpg"
         thumbnail_path = os.path.join(temp_dir, thumbnail_name)
     
+    # 先写入临时文件，避免超时或失败时留下不完整的缩略图被当作缓存
+    tmp_path = f"{thumbnail_path}.{threading.get_ident()}.tmp.jpg"
     try:
-        # 使用ffmpeg提取视频第1秒的帧作为缩略图
-        cmd = f'ffmpeg -i "{video_path}" -ss {time_sec} -vframes 1 -q:v 2 "{thumbnail_path}" -y'
-        import subprocess
-        # 使用二进制模式避免编码问题
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=False)
-        
-        if result.returncode == 0 and os.path.exists(thumbnail_path):
+        # 默认取视频第1秒的帧；视频不足1秒时fast模式取不到帧，改取第一帧
+        ok = _extract_video_frame(video_path, tmp_path, time_sec, timeout, mode, pipe)
+        if not ok and mode == "fast" and time_sec:
+            ok = _extract_video_frame(video_path, tmp_path, 0, timeout, mode, pipe)
+        if ok:
+            os.replace(tmp_path, thumbnail_path)
             return thumbnail_path
-        else:
-            return None
+        return None
+    except FileNotFoundError:
+        # 未安装ffmpeg
+        return None
     except Exception as e:
         print(f"提取视频缩略图失败: {e}")
         return None
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+def probe_video_duration(video_path, timeout=VIDEO_THUMBNAIL_TIMEOUT):
+    """用ffprobe读取视频时长（秒），失败时返回None"""
+    try:
+        returncode, output = run_ffmpeg(["-show_entries", "format=duration", "-of", "csv=p=0", video_path],
+                                        timeout, binary=FFPROBE_BIN)
+        duration = float(output.decode("ascii", "ignore").strip()) if returncode == 0 else 0
+    except (OSError, ValueError):
+        return None
+    except Exception as e:
+        print(f"读取视频时长失败: {e}")
+        return None
+    return duration if duration > 0 else None
+
+def storyboard_grid(frames):
+    """多帧预览图的列数和行数"""
+    cols = math.ceil(math.sqrt(frames))
+    return cols, math.ceil(frames / cols)
+
+def build_storyboard_args(video_path, duration, frames, size, output):
+    """生成一次性提取多帧预览图的ffmpeg参数
+
+    只解码关键帧（-skip_frame nokey），用 fps 按时长等间隔输出 frames 帧（间隔内没有关键帧时
+    重复前一个关键帧），格子数不受关键帧分布影响，网格总是恰好填满 frames 格。
+    每帧按与单帧缩略图相同的方式缩小到 size 以内，再用 tile 拼成一张网格图。
+    """
+    cols, rows = storyboard_grid(frames)
+    interval = duration / frames
+    w, h = size
+    vf = (f"fps={1 / interval:.9g},"
+          f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
+          f"tile={cols}x{rows}")
+    return ["-skip_frame", "nokey", "-i", video_path, "-an", "-vf", vf,
+            "-frames:v", "1", "-q:v", "3", "-y", output]
 
-def get_video_thumbnail(video_path, cache_dir=None):
-    """获取视频缩略图，优先从缓存加载"""
-    if not os.path.exists(video_path):
+def get_video_storyboard(video_path, timeout=VIDEO_THUMBNAIL_TIMEOUT):
+    """获取视频的多帧预览图（网格图文件路径），优先从缓存加载；失败时返回None
+
+    会运行ffprobe和ffmpeg，不要在界面线程中调用。
+    """
+    st = stat_cache.stat(video_path)
+    if st is None:
         return None
-    
-    # 创建缓存目录
-    if cache_dir is None:
-        cache_dir = os.path.join(os.path.expanduser("~"), ".todo_video_thumbs")
-    os.makedirs(cache_dir, exist_ok=True)
-    
-    # 生成缓存文件名
-    video_mtime = os.path.getmtime(video_path)
-    video_size = os.path.getsize(video_path)
-    cache_key = f"{os.path.basename(video_path)}_{video_size}_{video_mtime}"
-    import hashlib
-    cache_hash = hashlib.md5(cache_key.encode()).hexdigest()
-    cache_file = os.path.join(cache_dir, f"{cache_hash}.jpg")
-    
-    # 检查缓存是否存在
-    if os.path.exists(cache_file):
+    cache = get_video_thumbnail_cache()
+    spec = cache.make_spec(VIDEO_THUMBNAIL_SIZE, f"storyboard{VIDEO_STORYBOARD_FRAMES}fps")
+    key = cache.make_key(video_path, None, spec=spec, stat=st)
+    cache_file = cache.get(key)
+    if cache_file is not None:
         return cache_file
     
-    # 提取缩略图并保存到缓存
-    thumbnail = extract_video_thumbnail(video_path, cache_file)
-    return thumbnail
+    duration = probe_video_duration(video_path, timeout)
+    if not duration:
+        return None
+    tmp_path = os.path.join(cache.cache_dir, f"{key}.{threading.get_ident()}.tmp.jpg")
+    try:
+        returncode, _ = run_ffmpeg(build_storyboard_args(video_path, duration, VIDEO_STORYBOARD_FRAMES,
+                                                         VIDEO_THUMBNAIL_SIZE, tmp_path), timeout)
+        if returncode != 0 or not os.path.exists(tmp_path):
+            return None
+        return cache.put_file(key, tmp_path, ".jpg", video_path, spec)
+    except FileNotFoundError:
+        # 未安装ffmpeg
+        return None
+    except Exception as e:
+        print(f"生成视频预览图失败: {e}")
+        return None
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+def split_storyboard(storyboard_path, frames=None):
+    """把多帧预览图切成单帧PIL图片列表（按 build_storyboard_args 的网格切出全部 frames 格，纯色画面也保留）"""
+    frames = frames or VIDEO_STORYBOARD_FRAMES
+    cols, rows = storyboard_grid(frames)
+    cells = []
+    with Image.open(storyboard_path) as sheet:
+        sheet.load()
+        w, h = sheet.width // cols, sheet.height // rows
+        for i in range(frames):
+            x, y = (i % cols) * w, (i // cols) * h
+            cells.append(sheet.crop((x, y, x + w, y + h)))
+    return cells
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".wmv", ".flv", ".webm")
+
+def benchmark_video_extract(target, time_sec=1):
+    """比较各截图方式提取视频缩略图的耗时（不经过缓存）；target 为视频文件或文件夹"""
+    if os.path.isdir(target):
+        paths = sorted(os.path.join(target, name) for name in os.listdir(target)
+                       if name.lower().endswith(VIDEO_EXTENSIONS))
+    else:
+        paths = [target]
+    if not paths:
+        print(f"{target} 中没有视频")
+        return {}
+    import tempfile
+    variants = [("accurate", "accurate", False), ("fast", "fast", False), ("fast+pipe", "fast", True)]
+    print(f"{len(paths)} 个视频，截取第 {time_sec} 秒")
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, mode, pipe in variants:
+            failed = 0
+            start = time.perf_counter()
+            for i, path in enumerate(paths):
+                out = os.path.join(temp_dir, f"{name}_{i}.jpg")
+                if not extract_video_thumbnail(path, out, time_sec, timeout=None, mode=mode, pipe=pipe):
+                    failed += 1
+            results[name] = time.perf_counter() - start
+            speedup = results["accurate"] / results[name] if results[name] else float("inf")
+            print(f"{name:>10}: 共 {results[name]:.2f} 秒，平均 {results[name] / len(paths):.2f} 秒/个，"
+                  f"相对 accurate {speedup:.1f} 倍" + (f"，{failed} 个失败" if failed else ""))
+    return results
+
+def get_video_thumbnail(video_path, timeout=VIDEO_THUMBNAIL_TIMEOUT):
+    """获取视频缩略图，优先从缓存加载（未命中时会运行ffmpeg，不要在界面线程中调用）"""
+    st = stat_cache.stat(video_path)
+    if st is None:
+        return None
+    
+    # fast模式的截图已缩小到缩略图尺寸，与原始分辨率截图分开缓存
+    cache = get_video_thumbnail_cache()
+    spec = cache.make_spec(VIDEO_THUMBNAIL_SIZE, VIDEO_EXTRACT_MODE)
+    key = cache.make_key(video_path, None, spec=spec, stat=st)
+    cache_file = cache.get(key)
+    if cache_file is not None:
+        return cache_file
+    
+    # 提取缩略图并保存到缓存
+    tmp_path = os.path.join(cache.cache_dir, f"{key}.{threading.get_ident()}.tmp")
+    try:
+        if not extract_video_thumbnail(video_path, tmp_path, timeout=timeout):
+            return None
+        return cache.put_file(key, tmp_path, ".jpg", video_path, spec)
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+class VideoThumbnailUnavailable(Exception):
+    """视频无法提取缩略图（ffmpeg失败或超时）"""
+
+def decode_video_thumbnail(thumbnail_path, size):
+    """在后台线程中缩小缓存中的视频截图；截图文件丢失或损坏时删除该缓存条目后抛出异常，
+    调用方重新请求截图即可重新提取"""
+    try:
+        return decode_image_thumbnail(thumbnail_path, size)
+    except Exception:
+        get_video_thumbnail_cache().discard_file(thumbnail_path)
+        raise
+
+# ========================== 缩略图磁盘缓存 ==========================
+class ThumbnailDiskCache:
+    """缩小后的缩略图的磁盘缓存
+
+    缓存键由原文件路径、大小、修改时间、缩略图尺寸和生成方式计算，原文件被修改后自动失效。
+    缩略图保存为JPEG（带透明通道的保存为PNG），总大小超过上限时淘汰最久未使用的条目。
+    index.json 按最近使用顺序记录每个条目的文件名、原文件路径和生成规格，以及累计命中统计，
+    查找时只查索引不探测文件；索引丢失时按缓存目录中的文件重建（这些条目不知道原文件，清理时删除）。
+    可在多个线程中同时使用。
+    """
+
+    INDEX_FILE = "index.json"
+    INDEX_SAVE_INTERVAL = 50  # 每新增多少个条目保存一次索引
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # 缓存键 -> [文件名, 字节数, 原文件路径, 规格]，按最近使用排序
+        self._total_bytes = 0
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_index()
+
+    @staticmethod
+    def make_spec(size, variant=""):
+        """缩略图尺寸和生成方式组成的规格字符串"""
+        return f"{size[0]}x{size[1]}|{variant}"
+
+    @staticmethod
+    def make_key(path, size, variant="", spec=None, stat=None):
+        """根据文件路径、大小、修改时间、缩略图尺寸和生成方式计算缓存键
+
+        stat 为 (文件大小, 修改时间纳秒)，不传时直接读取文件状态。
+        """
+        if stat is None:
+            st = os.stat(path)
+            stat = (st.st_size, st.st_mtime_ns)
+        spec = spec if spec is not None else ThumbnailDiskCache.make_spec(size, variant)
+        fingerprint = f"{os.path.abspath(path)}|{stat[0]}|{stat[1]}|{spec}"
+        return hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+
+    def _load_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        index = {}
+        try:
+            with open(os.path.join(self.cache_dir, self.INDEX_FILE), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            pass
+        self.hits = index.get("hits", 0)
+        self.misses = index.get("misses", 0)
+        self.evictions = index.get("evictions", 0)
+        # 以目录中实际存在的文件为准：索引中缺失的文件丢弃，索引外的文件按修改时间补入
+        files = {}
+        leftovers = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.is_file() or entry.name == self.INDEX_FILE:
+                    continue
+                if ".tmp" in entry.name:
+                    # 上次异常退出时留下的临时文件
+                    leftovers.append(entry.name)
+                    continue
+                st = entry.stat()
+                files[entry.name] = (st.st_size, st.st_mtime)
+        self._remove_files(leftovers)
+        for key, file_name, *rest in index.get("entries", []):
+            if file_name in files:
+                source, spec = (rest + [None, ""])[:2]
+                self._entries[key] = [file_name, files.pop(file_name)[0], source, spec]
+        for file_name, (size, _) in sorted(files.items(), key=lambda item: item[1][1], reverse=True):
+            key = os.path.splitext(file_name)[0]
+            self._entries[key] = [file_name, size, None, ""]
+            self._entries.move_to_end(key, last=False)
+        self._total_bytes = sum(entry[1] for entry in self._entries.values())
+        self._remove_files(self._evict_locked())
+
+    def _evict_locked(self):
+        """超出容量时淘汰最久未使用的条目，返回要删除的文件名（调用方持有锁）"""
+        evicted = []
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._total_bytes -= entry[1]
+            self.evictions += 1
+            evicted.append(entry[0])
+        return evicted
+
+    def _remove_files(self, file_names):
+        for file_name in file_names:
+            try:
+                os.remove(os.path.join(self.cache_dir, file_name))
+            except OSError:
+                pass
+
+    def save_index(self):
+        """把索引写回磁盘"""
+        with self._lock:
+            data = {
+                "entries": [[key, *entry[:1], *entry[2:]] for key, entry in self._entries.items()],
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+            self._unsaved = 0
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        tmp_path = index_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            print(f"保存缩略图缓存索引失败: {e}")
+
+    def get(self, key):
+        """返回缓存的缩略图文件路径，未命中时返回None（只查索引）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return os.path.join(self.cache_dir, entry[0])
+
+    def discard(self, key):
+        """删除一个条目（缓存文件损坏或被外部删除时调用）"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return
+            self._total_bytes -= entry[1]
+        self._remove_files([entry[0]])
+
+    def discard_file(self, cache_file):
+        """按缓存文件路径删除条目（缓存文件名即缓存键加扩展名）"""
+        self.discard(os.path.splitext(os.path.basename(cache_file))[0])
+
+    def put(self, key, img, source=None, spec=""):
+        """保存缩略图（PIL图片），返回缓存文件路径"""
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            ext, fmt = ".png", "PNG"
+        else:
+            ext, fmt = ".jpg", "JPEG"
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+        tmp_file = os.path.join(self.cache_dir, f"{key}{ext}.{threading.get_ident()}.tmp")
+        img.save(tmp_file, fmt, **({"quality": 85} if fmt == "JPEG" else {}))
+        return self.put_file(key, tmp_file, ext, source, spec)
+
+    def put_file(self, key, file_path, ext=".jpg", source=None, spec=""):
+        """把已生成的缩略图文件移入缓存，返回缓存文件路径"""
+        file_name = f"{key}{ext}"
+        cache_file = os.path.join(self.cache_dir, file_name)
+        os.replace(file_path, cache_file)
+        size = os.path.getsize(cache_file)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+            self._entries[key] = [file_name, size, source and os.path.abspath(source), spec]
+            self._total_bytes += size
+            evicted = self._evict_locked()
+            self._unsaved += 1
+            save_now = self._unsaved >= self.INDEX_SAVE_INTERVAL
+        self._remove_files(evicted)
+        if save_now:
+            self.save_index()
+        return cache_file
+
+    def load_or_create(self, path, size, make_func, variant=""):
+        """返回 path 的缩略图（PIL图片）：命中缓存时直接读取小图，否则调用 make_func(path, size) 生成并缓存"""
+        spec = self.make_spec(size, variant)
+        st = stat_cache.stat(path)
+        if st is None:
+            raise FileNotFoundError(path)
+        key = self.make_key(path, size, spec=spec, stat=st)
+        cache_file = self.get(key)
+        if cache_file is not None:
+            try:
+                img = Image.open(cache_file)
+                img.load()
+                return img
+            except Exception:
+                self.discard(key)
+        img = make_func(path, size)
+        try:
+            self.put(key, img, path, spec)
+        except Exception as e:
+            print(f"写入缩略图缓存失败: {e}")
+        return img
+
+    def sweep(self, referenced_paths):
+        """删除不再需要的条目：原文件已不被任何任务引用、已被修改或删除，或来源未知的条目
+
+        referenced_paths 为仍被引用的原文件绝对路径集合。会检查原文件状态，应在后台线程中调用。
+        返回删除的条目数。
+        """
+        with self._lock:
+            snapshot = [(key, entry[2], entry[3]) for key, entry in self._entries.items()]
+        stale = []
+        for key, source, spec in snapshot:
+            if not source or source not in referenced_paths:
+                stale.append(key)
+                continue
+            try:
+                if self.make_key(source, None, spec=spec) != key:
+                    stale.append(key)
+            except OSError:
+                stale.append(key)
+        removed = []
+        with self._lock:
+            for key in stale:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._total_bytes -= entry[1]
+                    removed.append(entry[0])
+        self._remove_files(removed)
+        if removed:
+            self.save_index()
+        return len(removed)
+
+    def stats(self):
+        """缓存统计：命中、未命中、淘汰次数，条目数和占用字节数"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
+
+_thumbnail_cache = None  # 全局图片缩略图磁盘缓存（首次使用时创建）
+_video_thumbnail_cache = None  # 全局视频截图磁盘缓存（首次使用时创建）
+_thumbnail_cache_lock = threading.Lock()
+
+def get_thumbnail_cache():
+    """获取全局图片缩略图磁盘缓存"""
+    global _thumbnail_cache
+    with _thumbnail_cache_lock:
+        if _thumbnail_cache is None:
+            _thumbnail_cache = ThumbnailDiskCache(THUMBNAIL_CACHE_DIR, THUMBNAIL_CACHE_MAX_BYTES)
+        return _thumbnail_cache
+
+def get_video_thumbnail_cache():
+    """获取全局视频截图磁盘缓存"""
+    global _video_thumbnail_cache
+    with _thumbnail_cache_lock:
+        if _video_thumbnail_cache is None:
+            _video_thumbnail_cache = ThumbnailDiskCache(VIDEO_THUMBNAIL_CACHE_DIR, VIDEO_THUMBNAIL_CACHE_MAX_BYTES)
+        return _video_thumbnail_cache
+
+def sweep_thumbnail_caches():
+    """在后台清理缩略图缓存中已不被任何任务引用的条目（在界面线程中调用）"""
+    image_paths = set()
+    video_paths = set()
+    for task in todo_list:
+        image_paths.update(os.path.abspath(path) for path in task.img_paths)
+        video_paths.update(os.path.abspath(path) for path in task.video_paths)
+    
+    def sweep():
+        for get_cache, paths, name in ((get_thumbnail_cache, image_paths, "图片"),
+                                       (get_video_thumbnail_cache, video_paths, "视频")):
+            try:
+                get_cache().sweep(paths)
+            except Exception as e:
+                print(f"清理{name}缩略图缓存失败: {e}")
+    
+    threading.Thread(target=sweep, name="thumbnail-sweep", daemon=True).start()
+
+# ========================== 缩略图内存缓存 ==========================
+class PhotoImageCache:
+    """所有详情窗口共用的 PhotoImage 缓存，按位图字节数（宽×高×4）限制总大小，淘汰最久未使用的
+
+    只在界面线程中使用。被淘汰的图片如果仍显示在某个标签上，会由标签保持引用直到标签销毁。
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._images = OrderedDict()  # 缓存键 -> (PhotoImage, 字节数, 源文件状态)
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """返回 (PhotoImage, 生成时源文件的状态)，未命中时返回None"""
+        item = self._images.get(key) if key is not None else None
+        if item is None:
+            self.misses += 1
+            return None
+        self._images.move_to_end(key)
+        self.hits += 1
+        return item[0], item[2]
+
+    def put(self, key, photo, signature=None):
+        """加入缓存，signature 为生成图片时源文件的 (大小, 修改时间)；超出容量时淘汰最久未使用的图片"""
+        if key is None:
+            return
+        size = photo.width() * photo.height() * 4
+        old = self._images.pop(key, None)
+        if old is not None:
+            self._total_bytes -= old[1]
+        self._images[key] = (photo, size, signature)
+        self._total_bytes += size
+        while self._total_bytes > self.max_bytes and len(self._images) > 1:
+            _, (_, old_size, _) = self._images.popitem(last=False)
+            self._total_bytes -= old_size
+
+    def stats(self):
+        """缓存统计：命中、未命中次数，图片数和占用字节数"""
+        return {"hits": self.hits, "misses": self.misses,
+                "entries": len(self._images), "bytes": self._total_bytes}
+
+photo_image_cache = PhotoImageCache(PHOTO_CACHE_MAX_BYTES)  # 全局缩略图位图缓存
+
+def photo_cache_key(path, size, variant=""):
+    """PhotoImage 缓存键（不访问文件系统，文件是否被修改由缓存中记录的源文件状态判断）"""
+    return (os.path.abspath(path), tuple(size), variant)
+
+# ========================== 缩略图后台加载 ==========================
+_thumbnail_executor = None  # 缩略图解码线程池（首次使用时创建）
+
+def get_thumbnail_executor():
+    """获取全局缩略图解码线程池"""
+    global _thumbnail_executor
+    if _thumbnail_executor is None:
+        _thumbnail_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS,
+                                                 thread_name_prefix="thumbnail")
+    return _thumbnail_executor
+
+def shutdown_thumbnail_workers():
+    """退出程序时丢弃尚未开始的解码和视频截图任务，并保存缩略图缓存索引"""
+    if _thumbnail_executor is not None:
+        _thumbnail_executor.shutdown(wait=False, cancel_futures=True)
+    if _video_thumbnail_service is not None:
+        _video_thumbnail_service.shutdown()
+    for cache in (_thumbnail_cache, _video_thumbnail_cache):
+        if cache is not None:
+            cache.save_index()
+
+def _read_exif_thumbnail(img, size):
+    """读取JPEG中EXIF自带的缩略图；尺寸不够或宽高比与原图不一致（带黑边）时返回None"""
+    try:
+        from PIL import ExifTags
+        exif = img.getexif()
+        ifd1 = exif.get_ifd(ExifTags.IFD.IFD1)
+        offset = ifd1.get(0x0201)  # JPEGInterchangeFormat
+        length = ifd1.get(0x0202)  # JPEGInterchangeFormatLength
+        raw = img.info.get("exif")
+        if not offset or not length or not raw:
+            return None
+        # 偏移量相对于TIFF头，raw 以 "Exif\0\0" 开头
+        start = 6 + offset if raw.startswith(b"Exif") else offset
+        import io
+        thumb = Image.open(io.BytesIO(raw[start:start + length]))
+        thumb.load()
+    except Exception:
+        return None
+    # 原图缩小到 size 以内后的尺寸
+    scale = min(size[0] / img.width, size[1] / img.height, 1)
+    if thumb.width < img.width * scale or thumb.height < img.height * scale:
+        return None
+    if abs(thumb.width / thumb.height - img.width / img.height) > 0.02:
+        return None
+    return thumb
+
+def decode_image_thumbnail(path, size, mode=None):
+    """打开图片并缩小到 size 以内，返回PIL图片
+
+    mode 为 None 时使用 THUMBNAIL_DECODE_MODE：
+      "fast"     优先使用EXIF自带的缩略图；JPEG用 draft() 在解码时直接按1/2~1/8缩小，
+                 其他格式先用 reduce() 按整数倍缩小（reducing_gap=1.0）再精确缩放
+      "balanced" Pillow默认方式（draft 和 reduce 保留2倍余量，画质与速度折中）
+      "quality"  完整解码原图后用LANCZOS缩放
+    """
+    mode = mode or THUMBNAIL_DECODE_MODE
+    with Image.open(path) as img:
+        if mode == "quality":
+            img.load()
+            img.thumbnail(size, Image.LANCZOS, reducing_gap=None)
+        elif mode == "fast":
+            if img.format == "JPEG":
+                thumb = _read_exif_thumbnail(img, size)
+                if thumb is not None:
+                    thumb.thumbnail(size)
+                    return thumb
+                img.draft(img.mode if img.mode in ("RGB", "L") else "RGB", size)
+            img.thumbnail(size, reducing_gap=1.0)
+        else:
+            img.thumbnail(size)
+        return img.copy()
+
+def make_image_thumbnail(path, size):
+    """在后台线程中获取图片缩略图（优先读磁盘缓存），返回PIL图片（PhotoImage只能在界面线程中创建）"""
+    try:
+        cache = get_thumbnail_cache()
+    except OSError as e:
+        print(f"打开缩略图缓存失败: {e}")
+        return decode_image_thumbnail(path, size)
+    return cache.load_or_create(path, size, decode_image_thumbnail, THUMBNAIL_DECODE_MODE)
+
+def refresh_image_thumbnail(path, size, known_stat=None):
+    """在后台线程中检查图片是否存在，返回 (PIL图片, 文件状态)
+
+    文件不存在时返回 (None, None)；文件状态与 known_stat（界面上已显示的缩略图对应的状态）一致时
+    不重新解码，返回 (None, 文件状态)。
+    """
+    st = stat_cache.stat(path)
+    if st is None or st == known_stat:
+        return None, st
+    return make_image_thumbnail(path, size), st
+
+def stat_paths(paths):
+    """在后台线程中批量获取附件文件大小，不存在的文件为None"""
+    return [stat_cache.getsize(p) for p in paths]
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp")
+
+def benchmark_thumbnail_decode(folder, size=IMAGE_THUMBNAIL_SIZE, modes=("quality", "balanced", "fast")):
+    """比较各解码模式为文件夹中的图片生成缩略图的耗时（不经过磁盘缓存），返回 {模式: 秒数}"""
+    paths = sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if not paths:
+        print(f"{folder} 中没有图片")
+        return {}
+    print(f"{len(paths)} 张图片，缩略图尺寸 {size[0]}x{size[1]}")
+    results = {}
+    for mode in modes:
+        failed = 0
+        start = time.perf_counter()
+        for path in paths:
+            try:
+                decode_image_thumbnail(path, size, mode)
+            except Exception:
+                failed += 1
+        results[mode] = time.perf_counter() - start
+        baseline = results[modes[0]]
+        speedup = baseline / results[mode] if results[mode] else float("inf")
+        print(f"{mode:>9}: 共 {results[mode]:.2f} 秒，平均 {results[mode] / len(paths) * 1000:.1f} 毫秒/张，"
+              f"相对 {modes[0]} {speedup:.1f} 倍" + (f"，{failed} 张失败" if failed else ""))
+    return results
+
+class ThumbnailLoader:
+    """为一个窗口在后台线程池中执行解码任务，并把结果交回界面线程
+
+    工作线程只负责解码，结果放入队列；界面线程用 widget.after 定时取出结果并调用回调，
+    每次只处理一小段时间，避免大量缩略图同时完成时卡住界面。
+    reset() 丢弃尚未完成的任务（重新加载缩略图时调用），close() 在窗口关闭时调用。
+    """
+
+    POLL_INTERVAL = 30  # 取结果的间隔（毫秒）
+    POLL_BUDGET = 0.015  # 每次取结果最多占用界面线程的秒数
+
+    def __init__(self, widget):
+        self.widget = widget
+        self._results = queue.Queue()
+        self._futures = set()
+        self._generation = 0
+        self._pending = 0
+        self._poll_timer = None
+        self._closed = False
+
+    def submit(self, func, args, callback):
+        """在后台执行 func(*args)，完成后在界面线程中调用 callback(result, error)"""
+        if self._closed:
+            return
+        future = get_thumbnail_executor().submit(self._run, self._generation, func, args, callback)
+        self._futures.add(future)
+        self._pending += 1
+        self._schedule_poll()
+
+    def watch(self, future, callback):
+        """在其他线程池中执行的 future 完成后，于界面线程中调用 callback(result, error)"""
+        if self._closed:
+            return
+        generation = self._generation
+        
+        def on_done(done_future):
+            if done_future.cancelled():
+                result, error = None, RuntimeError("任务已取消")
+            else:
+                error = done_future.exception()
+                result = None if error is not None else done_future.result()
+            self._results.put((generation, callback, result, error))
+        
+        self._pending += 1
+        future.add_done_callback(on_done)
+        self._schedule_poll()
+
+    def _run(self, generation, func, args, callback):
+        # 任务已被丢弃时不再解码
+        if self._closed or generation != self._generation:
+            return
+        try:
+            result, error = func(*args), None
+        except Exception as e:
+            result, error = None, e
+        self._results.put((generation, callback, result, error))
+
+    def _schedule_poll(self):
+        if self._poll_timer is None and not self._closed:
+            self._poll_timer = self.widget.after(self.POLL_INTERVAL, self._poll)
+
+    def _poll(self):
+        self._poll_timer = None
+        if self._closed:
+            return
+        deadline = time.perf_counter() + self.POLL_BUDGET
+        while time.perf_counter() < deadline:
+            try:
+                generation, callback, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self._generation:
+                continue
+            self._pending -= 1
+            try:
+                callback(result, error)
+            except Exception as e:
+                print(f"显示缩略图失败: {e}")
+        if self._pending > 0:
+            self._schedule_poll()
+
+    def reset(self):
+        """丢弃所有未完成的任务"""
+        self._generation += 1
+        self._pending = 0
+        for future in self._futures:
+            future.cancel()
+        self._futures.clear()
+
+    def close(self):
+        """窗口关闭时取消所有任务并停止取结果"""
+        self.reset()
+        self._closed = True
+        if self._poll_timer is not None:
+            try:
+                self.widget.after_cancel(self._poll_timer)
+            except tk.TclError:
+                pass
+            self._poll_timer = None
+
+# ========================== 项目文件夹管理函数 ==========================
+def sanitize_filename(filename):
+    """清理文件名，移除非法字符"""
+    # Windows文件名非法字符: \ / : * ? " < > |
+    illegal_chars = r'[\\/*?:"<>|]'
+    import re
+    return re.sub(illegal_chars, '_', filename)
+
+def _create_exclusive(path):
+    """原子地创建空文件，文件已存在时抛出 FileExistsError"""
+    os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+
+class NameRegistry:
+    """按目录记录已占用的名称，为新文件或文件夹分配不重名的名称
+
+    每个目录首次使用时用一次 os.scandir 读取已有名称，之后在内存中维护，并记住每个名称下一个可用的数字后缀，
+    第N个重名文件不必再逐个探测 _1、_2……。分配到的名称立即以 O_EXCL 创建空文件（文件夹用 mkdir）占住，
+    其他程序恰好创建了同名文件时自动换下一个。可在多个线程中同时使用。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirs = {}  # 目录 -> [已占用名称集合, {名称: 下一个数字后缀}]
+
+    @staticmethod
+    def _dir_key(directory):
+        return os.path.normcase(os.path.abspath(directory))
+
+    def _listing_locked(self, directory):
+        key = self._dir_key(directory)
+        listing = self._dirs.get(key)
+        if listing is None:
+            names = set()
+            try:
+                with os.scandir(directory) as it:
+                    names = {os.path.normcase(entry.name) for entry in it}
+            except FileNotFoundError:
+                pass
+            listing = self._dirs[key] = [names, {}]
+        return listing
+
+    def reserve(self, directory, name, numbered, create):
+        """在 directory 中为 name 分配不重名的名称并用 create(路径) 创建，返回路径
+
+        name 已被占用时依次尝试 numbered(1)、numbered(2)……；create 在路径已存在时应抛出 FileExistsError。
+        create 抛出其他异常时原样抛出，已占用名称和数字后缀都不变。
+        """
+        with self._lock:
+            names, counters = self._listing_locked(directory)
+            base = os.path.normcase(name)
+            counter = counters.get(base, 0)
+            while True:
+                candidate = name if counter == 0 else numbered(counter)
+                counter += 1
+                if os.path.normcase(candidate) in names:
+                    continue
+                path = os.path.join(directory, candidate)
+                try:
+                    create(path)
+                except FileExistsError:
+                    # 其他程序已创建同名文件，记为已占用后换下一个；其他错误直接抛出，不改变记录
+                    names.add(os.path.normcase(candidate))
+                    continue
+                names.add(os.path.normcase(candidate))
+                counters[base] = counter
+                return path
+
+    def reserve_file(self, directory, filename):
+        """分配不重名的文件名（重名时为 名称_1.扩展名）并创建空文件占住，返回路径"""
+        stem, ext = os.path.splitext(filename)
+        return self.reserve(directory, filename, lambda n: f"{stem}_{n}{ext}", _create_exclusive)
+
+    def reserve_dir(self, parent, name):
+        """分配不重名的文件夹名（重名时为 名称_1）并创建该文件夹，返回路径"""
+        return self.reserve(parent, name, lambda n: f"{name}_{n}", os.mkdir)
+
+    def invalidate(self, path=None):
+        """丢弃 path 及其下所有目录的记录（文件夹被删除后调用）；不传参数时清空全部记录"""
+        with self._lock:
+            if path is None:
+                self._dirs.clear()
+                return
+            key = self._dir_key(path)
+            prefix = os.path.join(key, "")
+            for directory in [d for d in self._dirs if d == key or d.startswith(prefix)]:
+                del self._dirs[directory]
+
+name_registry = NameRegistry()  # 全局项目文件夹名称分配
+
+def create_project_folder(task_id, task_title):
+    """为任务创建项目文件夹（文件夹名使用任务ID前缀，不随任务序号变化）"""
+    # 确保项目根目录存在
+    os.makedirs(PROJECTS_ROOT, exist_ok=True)
+    
+    # 清理任务标题，用于文件夹名
+    safe_title = sanitize_filename(task_title)
+    if not safe_title or safe_title.isspace():
+        safe_title = f"任务{task_id[:8]}"
+    
+    # 创建文件夹名
+    folder_name = f"项目{task_id[:8]}_{safe_title[:50]}"  # 限制长度
+    
+    # 创建项目文件夹（如果文件夹已存在，添加数字后缀）和子文件夹
+    try:
+        project_path = name_registry.reserve_dir(PROJECTS_ROOT, folder_name)
+        os.makedirs(os.path.join(project_path, "images"))
+        os.makedirs(os.path.join(project_path, "videos"))
+        os.makedirs(os.path.join(project_path, "files"))
+        os.makedirs(os.path.join(project_path, "docs"))
+        
+        # 创建项目信息文件
+        info_file = os.path.join(project_path, "project_info.txt")
+        import datetime
+        with open(info_file, "w", encoding="utf-8") as f:
+            f.write(f"项目名称: {task_title}\n")
+            f.write(f"创建时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write(f"任务ID: {task_id}\n")
+            f.write(f"原始标题: {task_title}\n")
+        
+        return project_path
+    except Exception as e:
+        print(f"创建项目文件夹失败: {e}")
+        return None
+
+def project_target_path(original_path, project_path, file_type="files"):
+    """确定文件复制到项目文件夹后的路径并创建空文件占住（目标文件夹不存在时创建，重名时添加数字后缀）"""
+    # 获取文件名
+    filename = os.path.basename(original_path)
+    
+    # 确定目标文件夹
+    if file_type == "images":
+        target_dir = os.path.join(project_path, "images")
+    elif file_type == "videos":
+        target_dir = os.path.join(project_path, "videos")
+    elif file_type == "docs":
+        target_dir = os.path.join(project_path, "docs")
+    else:
+        target_dir = os.path.join(project_path, "files")
+    
+    # 确保目标文件夹存在（项目文件夹本身不存在时不重新创建，例如任务已被删除）
+    if not os.path.isdir(project_path):
+        raise FileNotFoundError(f"项目文件夹不存在: {project_path}")
+    os.makedirs(target_dir, exist_ok=True)
+    
+    # 生成目标路径（如果文件已存在，添加数字后缀）
+    target_path = name_registry.reserve_file(target_dir, filename)
+    stat_cache.invalidate(target_dir)
+    return target_path
+
+class ImportCancelled(Exception):
+    """附件导入被取消"""
+
+def copy_stream_chunked(read_chunk, dst, progress=None, cancelled=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """分块写入文件：read_chunk(缓冲区) 读入一块并返回字节数，返回0时结束
+
+    每写入一块调用一次 progress(已写入字节数)；cancelled() 返回True时停止并抛出 ImportCancelled。
+    取消或出错时删除已写入的部分文件。
+    """
+    copied = 0
+    try:
+        with open(dst, "wb") as fout:
+            buffer = bytearray(chunk_size)
+            view = memoryview(buffer)
+            while True:
+                if cancelled is not None and cancelled():
+                    raise ImportCancelled(dst)
+                n = read_chunk(buffer)
+                if not n:
+                    break
+                fout.write(view[:n])
+                copied += n
+                if progress is not None:
+                    progress(copied)
+    except BaseException:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        raise
+    return copied
+
+def copy_file_chunked(src, dst, progress=None, cancelled=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """分块复制文件并保留修改时间等信息，参数同 copy_stream_chunked"""
+    import shutil
+    try:
+        with open(src, "rb") as fin:
+            copied = copy_stream_chunked(fin.readinto, dst, progress, cancelled, chunk_size)
+        shutil.copystat(src, dst)
+    except BaseException:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        raise
+    finally:
+        stat_cache.invalidate(os.path.dirname(dst))
+    return copied
+
+ATTACH_MODES = ("copy", "reflink", "hardlink", "move", "reference", "auto")
+_FICLONE = 0x40049409  # Linux ioctl：在支持的文件系统（Btrfs、XFS等）上共享数据块克隆文件
+
+def reflink_file(src, dst):
+    """用写时复制克隆文件（只复制元数据，与复制的结果相同），不支持时抛出 OSError"""
+    if not sys.platform.startswith("linux"):
+        raise OSError("当前系统不支持克隆文件")
+    import fcntl
+    import shutil
+    try:
+        with open(src, "rb") as fin, open(dst, "wb") as fout:
+            fcntl.ioctl(fout.fileno(), _FICLONE, fin.fileno())
+        shutil.copystat(src, dst)
+    except BaseException:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        raise
+
+def link_file(src, dst):
+    """为 src 创建硬链接 dst，dst 已存在（如预留的空文件）时替换它"""
+    tmp_path = f"{dst}.{uuid.uuid4().hex}.tmp"
+    os.link(src, tmp_path)
+    try:
+        os.replace(tmp_path, dst)
+    except OSError:
+        os.remove(tmp_path)
+        raise
+
+def attach_file(src, dst, mode=None, progress=None, cancelled=None):
+    """按添加附件的方式（默认 ATTACH_MODE）把原文件放到 dst，返回任务中应记录的路径
+
+    克隆、硬链接、移动不成功时（例如跨文件系统或文件系统不支持）改为复制；
+    "reference" 不在项目文件夹中放任何文件，直接返回原文件路径。
+    """
+    mode = mode or ATTACH_MODE
+    if mode not in ATTACH_MODES:
+        raise ValueError(f"未知的添加附件方式: {mode}")
+    if cancelled is not None and cancelled():
+        raise ImportCancelled(src)
+    
+    def done():
+        # 不复制数据的方式一次完成，直接报告全部进度
+        stat_cache.invalidate(os.path.dirname(dst))
+        if progress is not None:
+            progress(os.path.getsize(dst))
+        return dst
+    
+    if mode == "reference":
+        return os.path.abspath(src)
+    if mode in ("reflink", "auto"):
+        try:
+            reflink_file(src, dst)
+            return done()
+        except OSError:
+            pass
+    elif mode == "hardlink":
+        try:
+            link_file(src, dst)
+            return done()
+        except OSError as e:
+            print(f"创建硬链接失败，改为复制: {e}")
+    elif mode == "move":
+        try:
+            os.replace(src, dst)
+            stat_cache.invalidate(os.path.dirname(src))
+            return done()
+        except OSError:
+            # 跨文件系统时先复制，复制完成后再删除原文件
+            copy_file_chunked(src, dst, progress, cancelled)
+            os.remove(src)
+            stat_cache.invalidate(os.path.dirname(src))
+            return dst
+    copy_file_chunked(src, dst, progress, cancelled)
+    return dst
+
+def copy_file_to_project(original_path, project_path, file_type="files"):
+    """将文件复制到项目文件夹"""
+    if not os.path.exists(original_path):
+        return None
+    
+    try:
+        target_path = project_target_path(original_path, project_path, file_type)
+        return store_attachment(original_path, target_path)
+    except Exception as e:
+        print(f"复制文件失败: {e}")
+        return None
+
+def get_file_type_from_extension(filepath):
+    """根据文件扩展名确定文件类型"""
+    ext = os.path.splitext(filepath)[1].lower()
+    image_exts = ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp']
+    video_exts = ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm']
+    doc_exts = ['.doc', '.docx', '.pdf', '.txt', '.xls', '.xlsx', '.ppt', '.pptx']
+    
+    if ext in image_exts:
+        return "images"
+    elif ext in video_exts:
+        return "videos"
+    elif ext in doc_exts:
+        return "docs"
+    else:
+        return "files"
+
+class MigrationEngine:
+    """把已有附件迁移到项目文件夹：先规划全部复制，再在有界线程池中按文件从大到小的顺序执行
+
+    大文件先开始复制，避免最后只剩一个大文件在单个线程里复制。每个文件复制完成后向项目文件夹中的
+    清单文件追加一行记录，中断后再次迁移同一批文件时跳过已复制完成的（原文件未被修改的）文件；
+    全部成功后删除清单。
+    """
+
+    MANIFEST_FILE = ".migration_manifest"
+
+    def __init__(self, project_path, workers=MIGRATION_WORKERS):
+        self.project_path = project_path
+        self.workers = workers
+        self.manifest_path = os.path.join(project_path, self.MANIFEST_FILE)
+        self._lock = threading.Lock()
+        self._done = self._load_manifest()  # 清单键 -> 复制后的路径
+        self._items = []  # (组号, 位置, 原路径, 子文件夹, 大小, 清单键)
+        self._results = []  # 每组附件迁移后的路径，复制失败的为None
+        self.copied_files = 0
+        self.copied_bytes = 0
+        self.resumed_files = 0
+        self.failed_files = 0
+        self.total_files = 0  # 本次需要复制的文件数和字节数（run() 开始后有效）
+        self.total_bytes = 0
+        self.elapsed = 0.0
+
+    def _load_manifest(self):
+        done = {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # 中断时只写了一半的行
+                    done[record["source"]] = record["target"]
+        except OSError:
+            pass
+        return done
+
+    def add(self, paths, file_type=None):
+        """规划一组附件的迁移，返回组号；file_type 为None时按扩展名确定每个文件的子文件夹"""
+        group = len(self._results)
+        self._results.append(list(paths))  # 不存在的文件保留原路径
+        inside = os.path.join(os.path.normcase(os.path.abspath(self.project_path)), "")
+        for pos, path in enumerate(paths):
+            if os.path.normcase(os.path.abspath(path)).startswith(inside):
+                continue  # 已经在项目文件夹中（例如继续上次中断的迁移时）
+            st = stat_cache.stat(path)
+            if st is None:
+                continue
+            key = f"{os.path.abspath(path)}|{st[0]}|{st[1]}"
+            self._items.append((group, pos, path, file_type or get_file_type_from_extension(path), st[0], key))
+        return group
+
+    def mark_started(self):
+        """在开始复制前创建清单文件：迁移中途退出或失败时清单保留，据此可以知道需要继续迁移"""
+        open(self.manifest_path, "a", encoding="utf-8").close()
+
+    def run(self):
+        """执行全部复制，返回每组附件迁移后的路径列表（复制失败的文件不再列出）"""
+        start = time.perf_counter()
+        pending = []
+        for item in self._items:
+            target = self._done.get(item[5])
+            if target and os.path.exists(target):
+                # 上次中断前已复制完成
+                self._results[item[0]][item[1]] = target
+                self.resumed_files += 1
+            else:
+                pending.append(item)
+        pending.sort(key=lambda item: item[4], reverse=True)  # 大文件先复制
+        self.total_files = len(pending)
+        self.total_bytes = sum(item[4] for item in pending)
+        
+        if pending:
+            with open(self.manifest_path, "a", encoding="utf-8") as manifest:
+                with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="migrate") as executor:
+                    futures = [executor.submit(self._copy, item, manifest) for item in pending]
+                    for future in futures:
+                        future.result()
+        if self.failed_files == 0:
+            try:
+                os.remove(self.manifest_path)
+            except OSError:
+                pass
+        self.elapsed = time.perf_counter() - start
+        return [[path for path in results if path is not None] for results in self._results]
+
+    def _copy(self, item, manifest):
+        group, pos, path, file_type, size, key = item
+        new_path = copy_file_to_project(path, self.project_path, file_type)
+        with self._lock:
+            self._results[group][pos] = new_path
+            if new_path is None:
+                self.failed_files += 1
+                return
+            self.copied_files += 1
+            self.copied_bytes += size
+            manifest.write(json.dumps({"source": key, "target": new_path}, ensure_ascii=False) + "\n")
+            manifest.flush()
+
+    def report(self):
+        """迁移统计：复制、续传跳过、失败的文件数，复制字节数、耗时和吞吐量"""
+        seconds = max(self.elapsed, 1e-6)
+        return {
+            "files": self.copied_files, "bytes": self.copied_bytes,
+            "resumed": self.resumed_files, "failed": self.failed_files,
+            "seconds": self.elapsed,
+            "files_per_sec": self.copied_files / seconds,
+            "mb_per_sec": self.copied_bytes / (1024 * 1024) / seconds,
+        }
+
+def migrate_existing_files(project_path, img_paths, video_paths, file_paths, engine=None):
+    """迁移现有文件到项目文件夹（并行复制，中断后再次迁移时跳过已复制完成的文件）
+
+    会阻塞到复制全部结束，不要在界面线程中调用；传入 engine 时可在其他线程中读取它的进度。
+    """
+    if engine is None:
+        engine = MigrationEngine(project_path)
+    engine.add(img_paths, "images")
+    engine.add(video_paths, "videos")
+    engine.add(file_paths)
+    migrated_img_paths, migrated_video_paths, migrated_file_paths = engine.run()
+    
+    report = engine.report()
+    if report["files"] or report["resumed"] or report["failed"]:
+        print(f"迁移附件：复制 {report['files']} 个文件（{report['bytes'] / (1024 * 1024):.1f} MB），"
+              f"跳过已完成 {report['resumed']} 个，失败 {report['failed']} 个，用时 {report['seconds']:.2f} 秒，"
+              f"{report['files_per_sec']:.1f} 个/秒，{report['mb_per_sec']:.1f} MB/秒")
+    return migrated_img_paths, migrated_video_paths, migrated_file_paths
+
+# ========================== 附件内容寻址存储 ==========================
+class BlobStore:
+    """按内容去重的附件存储：每份内容以 SHA-256 命名保存一次，项目文件夹中的附件是它的写时复制克隆
+
+    克隆与存储中的内容互不影响，直接修改某个任务的附件不会改变其他任务的附件。文件系统不支持克隆时
+    退而使用硬链接：此时各任务的附件与存储中的内容是同一个文件，直接修改其中一个会同时改变所有共用
+    该内容的附件（内容也不再与哈希相符），需要修改附件时应先另存一份。硬链接也不支持时，
+    任务中直接记录存储中的文件路径。
+    index.json 记录每份内容被哪些附件路径引用（同一路径可被引用多次），最后一个引用释放时删除内容；
+    还按 (原文件路径, 大小, 修改时间) 记住已算过的哈希，再次添加同一文件时不必重新读取。
+    索引修改后延迟 BLOB_INDEX_FLUSH_DELAY 毫秒批量写盘，退出程序时用 flush() 写入剩余的修改。
+    可在多个线程中同时使用。
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._objects = {}  # 内容哈希 -> {"size": 字节数, "refs": {附件路径: 引用次数}}
+        self._paths = {}  # 规范化的附件路径 -> 内容哈希
+        self._sources = {}  # "原文件路径|大小|修改时间" -> 内容哈希
+        self._dirty = False  # 索引有尚未写盘的修改
+        self._flush_timer = None  # 等待中的批量写盘定时器
+        self._flush_lock = threading.Lock()  # 保证索引文件按修改顺序写入
+        self._load_index()
+
+    @staticmethod
+    def _path_key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    @staticmethod
+    def _source_key(path, st):
+        return f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+
+    def object_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _load_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        index = {}
+        try:
+            with open(os.path.join(self.root, self.INDEX_FILE), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            pass
+        for digest, obj in index.get("objects", {}).items():
+            if os.path.exists(self.object_path(digest)):
+                self._objects[digest] = obj
+                for path in obj["refs"]:
+                    self._paths[self._path_key(path)] = digest
+        self._sources = {key: digest for key, digest in index.get("sources", {}).items()
+                         if digest in self._objects}
+        # 上次异常退出时留下的临时文件
+        for name in os.listdir(self.root):
+            if name.endswith(".tmp"):
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except OSError:
+                    pass
+
+    def _mark_dirty_locked(self):
+        """记录索引有修改，延迟写盘，连续添加或释放多个附件时只写一次"""
+        self._dirty = True
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(BLOB_INDEX_FLUSH_DELAY / 1000, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self):
+        """把索引中尚未写盘的修改写入磁盘"""
+        with self._flush_lock:
+            with self._lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                data = json.dumps({"objects": self._objects, "sources": self._sources}, ensure_ascii=False)
+            index_path = os.path.join(self.root, self.INDEX_FILE)
+            tmp_path = index_path + ".tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(tmp_path, index_path)
+            except OSError as e:
+                print(f"保存附件存储索引失败: {e}")
+
+    def _ingest(self, src, progress=None, cancelled=None):
+        """边复制边计算哈希，把原文件放入存储（内容已存在时丢弃复制的数据），返回内容哈希"""
+        tmp_path = os.path.join(self.root, f"{uuid.uuid4().hex}.tmp")
+        hasher = hashlib.sha256()
+        
+        # 复制时逐块计算哈希，大文件只需读一遍
+        with open(src, "rb") as fin:
+            def read_chunk(buffer):
+                n = fin.readinto(buffer)
+                if n:
+                    hasher.update(memoryview(buffer)[:n])
+                return n
+            
+            copy_stream_chunked(read_chunk, tmp_path, progress, cancelled)
+        digest = hasher.hexdigest()
+        object_path = self.object_path(digest)
+        with self._lock:
+            if digest in self._objects and os.path.exists(object_path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.replace(tmp_path, object_path)
+                self._objects[digest] = {"size": os.path.getsize(object_path), "refs": {}}
+        return digest
+
+    def add(self, src, target_path, progress=None, cancelled=None):
+        """把原文件作为附件保存到 target_path，返回任务中应记录的路径
+
+        同一文件（路径、大小、修改时间均未变）再次添加时直接复用已有内容，不再读取文件。
+        """
+        st = os.stat(src)
+        source_key = self._source_key(src, st)
+        with self._lock:
+            digest = self._sources.get(source_key)
+            if digest is not None and not os.path.exists(self.object_path(digest)):
+                digest = None
+        if digest is None:
+            digest = self._ingest(src, progress, cancelled)
+        elif progress is not None:
+            progress(st.st_size)
+        object_path = self.object_path(digest)
+        path = target_path
+        try:
+            reflink_file(object_path, target_path)
+        except OSError:
+            try:
+                # 不支持克隆时使用硬链接（与其他任务共用同一个文件，见类说明）
+                link_file(object_path, target_path)
+            except OSError as e:
+                # 也不支持硬链接时直接引用存储中的文件
+                print(f"创建硬链接失败，改为直接引用: {e}")
+                path = object_path
+        stat_cache.invalidate(os.path.dirname(target_path))
+        with self._lock:
+            self._sources[source_key] = digest
+            refs = self._objects[digest]["refs"]
+            refs[path] = refs.get(path, 0) + 1
+            self._paths[self._path_key(path)] = digest
+            self._mark_dirty_locked()
+        return path
+
+    def release(self, path):
+        """任务不再使用附件 path：删除项目文件夹中的链接，内容不再被引用时删除内容
+
+        不是由存储管理的路径返回False，不做任何处理。
+        """
+        key = self._path_key(path)
+        with self._lock:
+            digest = self._paths.get(key)
+            if digest is None:
+                return False
+            obj = self._objects[digest]
+            refs = obj["refs"]
+            ref_path = next((p for p in refs if self._path_key(p) == key), path)
+            refs[ref_path] = refs.get(ref_path, 1) - 1
+            remove_paths = []
+            if refs[ref_path] <= 0:
+                del refs[ref_path]
+                del self._paths[key]
+                if key != self._path_key(self.object_path(digest)):
+                    remove_paths.append(ref_path)
+            if not refs:
+                del self._objects[digest]
+                self._sources = {k: d for k, d in self._sources.items() if d != digest}
+                remove_paths.append(self.object_path(digest))
+            self._mark_dirty_locked()
+        for remove_path in remove_paths:
+            try:
+                os.remove(remove_path)
+            except OSError:
+                pass
+            stat_cache.invalidate(os.path.dirname(remove_path))
+        if not refs:
+            try:
+                os.rmdir(os.path.dirname(self.object_path(digest)))  # 同前缀目录中没有其他内容时删除
+            except OSError:
+                pass
+        return True
+
+    def stats(self):
+        """存储统计：内容份数、实际占用字节数、引用数和去重节省的字节数"""
+        with self._lock:
+            stored = sum(obj["size"] for obj in self._objects.values())
+            refs = sum(sum(obj["refs"].values()) for obj in self._objects.values())
+            referenced = sum(obj["size"] * sum(obj["refs"].values()) for obj in self._objects.values())
+        return {"objects": len(self._objects), "bytes": stored, "refs": refs, "saved_bytes": referenced - stored}
+
+_blob_store = None  # 附件内容存储（首次使用时创建）
+_blob_store_lock = threading.Lock()
+
+def get_blob_store():
+    """获取全局附件内容存储；未启用且从未使用过时返回None"""
+    global _blob_store
+    with _blob_store_lock:
+        if _blob_store is None and (BLOB_STORE_MODE or os.path.isdir(BLOB_STORE_DIR)):
+            _blob_store = BlobStore(BLOB_STORE_DIR)
+        return _blob_store
+
+def flush_blob_store():
+    """退出程序时把附件存储索引中尚未写盘的修改写入磁盘"""
+    if _blob_store is not None:
+        _blob_store.flush()
+
+def store_attachment(src, target_path, progress=None, cancelled=None):
+    """把附件保存到项目文件夹中的 target_path，返回任务中应记录的路径
+
+    target_path 通常是 project_target_path 预留的空文件。
+    启用内容存储时由存储去重保存（此时不使用 ATTACH_MODE，"reference" 除外），否则按 ATTACH_MODE 保存。
+    """
+    try:
+        if BLOB_STORE_MODE and ATTACH_MODE != "reference":
+            path = get_blob_store().add(src, target_path, progress, cancelled)
+        else:
+            path = attach_file(src, target_path, ATTACH_MODE, progress, cancelled)
+    except BaseException:
+        # 出错或取消时删除 project_target_path 预留的空文件
+        remove_reserved_file(target_path)
+        raise
+    if path != target_path:
+        # 直接引用其他位置的文件时不再需要预留的空文件
+        remove_reserved_file(target_path)
+    return path
+
+def remove_reserved_file(path):
+    """删除预留后没有用上的文件"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    stat_cache.invalidate(os.path.dirname(path))
+
+def release_attachments(paths):
+    """任务删除附件后调用：释放由内容存储管理的附件，其他附件保持原样"""
+    store = get_blob_store()
+    if store is None:
+        return
+    for path in paths:
+        try:
+            store.release(path)
+        except Exception as e:
+            print(f"释放附件失败: {e}")
+
+# ========================== 附件导入队列 ==========================
+_active_importers = set()  # 后台线程仍在运行的附件导入队列
+_active_importers_lock = threading.Lock()
+
+class AttachmentImporter:
+    """详情窗口的附件导入队列：在一个后台线程中逐个分块复制文件，进度和结果交回界面线程
+
+    add() 加入一批文件。每个文件复制完成后在界面线程中调用 file_callback(原路径, 复制后的路径, 错误)，
+    整批结束后调用 batch_callback(完成的文件数, 是否被取消)。on_progress(进度字典) 用于刷新进度条，
+    队列全部结束后以 None 调用一次。cancel() 取消正在复制和排队中的全部文件，已写入的部分文件会被删除。
+    结果用 root_window.after 取出，窗口关闭后已复制完成的文件仍会通过 file_callback 记入任务。
+    删除任务时用 delete_task_files() 停止该任务的导入后再删除项目文件夹，避免后台线程重新创建它。
+    """
+
+    POLL_INTERVAL = 100  # 刷新进度的间隔（毫秒）
+    PROGRESS_INTERVAL = 0.1  # 后台线程报告单个文件进度的最小间隔（秒）
+
+    def __init__(self, on_progress, task_id=None):
+        self.on_progress = on_progress
+        self.task_id = task_id
+        self._jobs = queue.Queue()
+        self._events = queue.Queue()
+        self._generation = 0  # cancel() 后递增，后台线程发现与批次的不一致即停止
+        self._thread = None
+        self._poll_timer = None
+        self._pending = 0  # 尚未结束的批次数
+        self._closed = False
+        # 以下进度只在界面线程中修改
+        self._total_bytes = 0
+        self._done_bytes = 0
+        self._total_files = 0
+        self._done_files = 0
+        self._current = None  # [文件名, 已复制字节数, 文件大小]
+
+    @property
+    def busy(self):
+        return self._pending > 0
+
+    def add(self, paths, project_path, file_type, file_callback, batch_callback=None):
+        """加入一批文件，file_type 为None时按扩展名确定每个文件的子文件夹"""
+        if self._closed or not paths:
+            return
+        self._pending += 1
+        self._jobs.put((self._generation, list(paths), project_path, file_type, file_callback, batch_callback))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, name="attachment-import", daemon=True)
+            with _active_importers_lock:
+                _active_importers.add(self)
+            self._thread.start()
+        self._schedule_poll()
+
+    def cancel(self):
+        """取消正在复制和排队中的全部文件"""
+        self._generation += 1
+
+    def close(self):
+        """窗口关闭时取消导入并不再刷新进度"""
+        self.cancel()
+        self._closed = True
+        self.on_progress = None
+        self._jobs.put(None)
+
+    def wait(self, timeout=None):
+        """等待后台线程结束（调用前先 close()）"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _worker(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                with _active_importers_lock:
+                    _active_importers.discard(self)
+                return
+            generation, paths, project_path, file_type, file_callback, batch_callback = job
+            is_cancelled = lambda: generation != self._generation
+            sizes = [stat_cache.getsize(p) or 0 for p in paths]
+            self._events.put(("queued", len(paths), sum(sizes)))
+            done = done_bytes = 0
+            cancelled = False
+            for path, size in zip(paths, sizes):
+                if is_cancelled():
+                    cancelled = True
+                    break
+                self._events.put(("start", os.path.basename(path), size))
+                last_report = [0.0]
+                
+                def progress(copied):
+                    now = time.perf_counter()
+                    if now - last_report[0] >= self.PROGRESS_INTERVAL:
+                        last_report[0] = now
+                        self._events.put(("progress", copied))
+                
+                target, error = None, None
+                try:
+                    if not os.path.exists(path):
+                        raise FileNotFoundError(path)
+                    target = project_target_path(path, project_path, file_type or get_file_type_from_extension(path))
+                    target = store_attachment(path, target, progress, is_cancelled)
+                except ImportCancelled:
+                    cancelled = True
+                    break
+                except Exception as e:
+                    target, error = None, e
+                    print(f"复制文件失败: {e}")
+                done += 1
+                done_bytes += size
+                self._events.put(("file", file_callback, path, target, error, size))
+            # 被取消的文件从总量中扣除
+            self._events.put(("batch", batch_callback, done, cancelled,
+                              len(paths) - done, sum(sizes) - done_bytes))
+
+    def _schedule_poll(self):
+        if self._poll_timer is None:
+            self._poll_timer = root_window.after(self.POLL_INTERVAL, self._poll)
+
+    def _poll(self):
+        self._poll_timer = None
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                self._handle(event)
+            except Exception as e:
+                print(f"导入附件失败: {e}")
+        if self._pending > 0:
+            self._report()
+            self._schedule_poll()
+        else:
+            self._total_bytes = self._done_bytes = self._total_files = self._done_files = 0
+            self._current = None
+            if self.on_progress is not None:
+                self.on_progress(None)
+
+    def _handle(self, event):
+        kind = event[0]
+        if kind == "queued":
+            self._total_files += event[1]
+            self._total_bytes += event[2]
+        elif kind == "start":
+            self._current = [event[1], 0, event[2]]
+        elif kind == "progress":
+            if self._current is not None:
+                self._current[1] = event[1]
+        elif kind == "file":
+            _, file_callback, path, target, error, size = event
+            self._done_files += 1
+            self._done_bytes += size
+            self._current = None
+            file_callback(path, target, error)
+        elif kind == "batch":
+            _, batch_callback, done, cancelled, skipped_files, skipped_bytes = event
+            self._pending -= 1
+            self._total_files -= skipped_files
+            self._total_bytes -= skipped_bytes
+            if cancelled:
+                self._current = None
+            if batch_callback is not None:
+                batch_callback(done, cancelled)
+
+    def _report(self):
+        if self.on_progress is None:
+            return
+        name, file_done, file_size = self._current or ("", 0, 0)
+        self.on_progress({
+            "file_name": name, "file_done": file_done, "file_size": file_size,
+            "done_files": self._done_files, "total_files": self._total_files,
+            "done_bytes": self._done_bytes + file_done, "total_bytes": self._total_bytes,
+        })
+
+def cancel_task_imports(task_id):
+    """取消某个任务正在进行的附件导入，返回仍在退出中的导入队列（后台线程会先删除已写入的部分文件）"""
+    with _active_importers_lock:
+        importers = [imp for imp in _active_importers if imp.task_id == task_id]
+    for importer in importers:
+        importer.close()
+    return importers
+
+def delete_task_files(task, on_done):
+    """删除任务后清理它的文件（在界面线程中调用，不等待）
+
+    先停止该任务正在进行的附件导入，在后台线程中等导入线程退出后再删除项目文件夹，
+    避免删除后又被重新创建。完成后在界面线程中调用 on_done(是否删除了项目文件夹)。
+    """
+    importers = cancel_task_imports(task.id)
+    project_path = task.project_path
+    result = queue.Queue()
+
+    def worker():
+        for importer in importers:
+            importer.wait()
+        if not project_path or not os.path.exists(project_path):
+            result.put(False)
+            return
+        try:
+            import shutil
+            shutil.rmtree(project_path)
+            result.put(True)
+        except Exception as e:
+            print(f"删除项目文件夹失败: {e}")
+            result.put(False)
+
+    def poll():
+        try:
+            folder_deleted = result.get_nowait()
+        except queue.Empty:
+            root_window.after(100, poll)
+            return
+        if folder_deleted:
+            stat_cache.invalidate(project_path)
+            name_registry.invalidate(project_path)
+        on_done(folder_deleted)
+
+    threading.Thread(target=worker, name="delete-task-files", daemon=True).start()
+    root_window.after(100, poll)
+
+# ========================== 视频缩略图服务 ==========================
+class VideoThumbnailService:
+    """在后台提取视频缩略图
+
+    最多同时运行 workers 个ffmpeg进程，其余请求排队；同一视频的同类并发请求共用一个任务。
+    request() / request_storyboard() 返回 Future，结果为缩略图文件路径（失败时为None），由调用方决定如何回到界面线程。
+    """
+
+    def __init__(self, workers, timeout):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ffmpeg")
+        self._jobs = {}  # (任务类型, 视频绝对路径) -> 进行中的 Future
+        self._lock = threading.Lock()
+
+    def request(self, video_path):
+        """请求视频缩略图，返回 Future"""
+        return self._submit("thumbnail", video_path, self._extract)
+
+    def request_storyboard(self, video_path):
+        """请求视频多帧预览图，返回 Future，结果为网格图文件路径（失败时为None）"""
+        return self._submit("storyboard", video_path, self._extract_storyboard)
+
+    def _submit(self, kind, video_path, func):
+        key = (kind, os.path.abspath(video_path))
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is None:
+                future = self._executor.submit(func, video_path)
+                self._jobs[key] = future
+                future.add_done_callback(lambda done, key=key: self._job_done(key, done))
+            return future
+
+    def _job_done(self, key, future):
+        with self._lock:
+            if self._jobs.get(key) is future:
+                del self._jobs[key]
+
+    def _extract(self, video_path):
+        return get_video_thumbnail(video_path, timeout=self.timeout)
+
+    def _extract_storyboard(self, video_path):
+        # 预览图需要扫描整个视频的关键帧，给更长的超时时间
+        return get_video_storyboard(video_path, timeout=self.timeout * 2)
+
+    def shutdown(self):
+        """丢弃排队中的请求并结束正在运行的ffmpeg进程"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        kill_running_ffmpeg()
+
+_video_thumbnail_service = None  # 全局视频缩略图服务（首次使用时创建）
+
+def get_video_thumbnail_service():
+    """获取全局视频缩略图服务"""
+    global _video_thumbnail_service
+    if _video_thumbnail_service is None:
+        _video_thumbnail_service = VideoThumbnailService(VIDEO_THUMBNAIL_WORKERS, VIDEO_THUMBNAIL_TIMEOUT)
+    return _video_thumbnail_service
+
+# ========================== 详情窗口附件缩略图条 ==========================
+class AttachmentStrip:
+    """详情窗口中横向排列的一排附件缩略图，按附件顺序保存每个附件的缩略图框架
+
+    增删附件时只创建或销毁受影响的缩略图，不重建整排。
+    make_tile(parent, path, index) 创建一个缩略图框架并 pack 到末尾，返回该框架；
+    框架可以带 renumber(index) 属性，删除前面的附件后用来更新显示的序号。
+    """
+
+    def __init__(self, parent, make_tile, empty_text, empty_pady):
+        self.parent = parent
+        self.make_tile = make_tile
+        self.empty_text = empty_text
+        self.empty_pady = empty_pady
+        self.tiles = []
+        self._empty_label = None
+
+    def set_items(self, paths):
+        """按附件列表重建整排缩略图"""
+        for widget in self.parent.winfo_children():
+            widget.destroy()
+        self._empty_label = None
+        self.tiles = []
+        self.append(paths)
+
+    def append(self, paths):
+        """在末尾为新增的附件创建缩略图"""
+        if paths and self._empty_label is not None:
+            self._empty_label.destroy()
+            self._empty_label = None
+        for path in paths:
+            self.tiles.append(self.make_tile(self.parent, path, len(self.tiles)))
+        self._update_empty()
+
+    def remove(self, indices):
+        """销毁指定位置的缩略图"""
+        indices = sorted(set(indices), reverse=True)
+        for idx in indices:
+            self.tiles.pop(idx).destroy()
+        if indices:
+            # 只需更新删除位置之后的序号
+            for idx in range(indices[-1], len(self.tiles)):
+                renumber = getattr(self.tiles[idx], "renumber", None)
+                if renumber:
+                    renumber(idx)
+        self._update_empty()
+
+    def _update_empty(self):
+        if not self.tiles and self._empty_label is None:
+            self._empty_label = tk.Label(self.parent, text=self.empty_text, bg="#f8fafc", fg="#cbd5e1",
+                                         font=("微软雅黑", 12), padx=20, pady=self.empty_pady)
+            self._empty_label.pack()
+
+# ========================== 主界面任务列表（虚拟化） ==========================
+class VirtualTaskList:
+    """主界面任务列表：只绘制视口内可见的行
+
+    画布上保留一组可复用的行图元（序号、状态、标题），滚动或刷新时只把它们重新绑定到
+    当前可见的任务上；点击和悬停统一由画布处理，根据鼠标纵坐标换算出对应的任务。
+    """
+
+    ROW_HEIGHT = 30  # 每行高度（像素）
+    PAD_X = 20  # 左右内边距
+    PAD_Y = 20  # 上下内边距
+    FONT = ("微软雅黑", 11)
+    BOLD_FONT = ("微软雅黑", 11, "bold")
+    TITLE_COLOR = "#1a73e8"
+    TITLE_HOVER_COLOR = "#0d47a1"
+
+    def __init__(self, parent, scrollbar, on_task_click):
+        self.scrollbar = scrollbar
+        self.on_task_click = on_task_click
+        self.canvas = tk.Canvas(parent, bg="#ffffff", bd=0, highlightthickness=0,
+                                yscrollcommand=self._on_yscroll)
+        scrollbar.config(command=self.canvas.yview)
+        self.rows = []  # 当前显示的任务（按显示顺序）
+        self.number_of = None  # 行首显示的序号：number_of(task)，为None时按行号从1编号
+        self.empty_text = ""  # 没有任务时显示的提示
+        self._pool = []  # 可复用的行图元，每项为 (序号, 状态, 右括号, 标题) 四个画布对象
+        self._slot_rows = []  # 每个图元槽当前绑定的行号
+        self._hover_row = None  # 鼠标悬停的行号
+        self._title_font = tkfont.Font(font=self.FONT)  # 用于测量标题宽度
+        self._empty_item = self.canvas.create_text(self.PAD_X, self.PAD_Y, anchor="nw", text="",
+                                                   fill="#666666", font=self.FONT)
+        self.canvas.bind("<Configure>", lambda e: self._redraw())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<Motion>", self._on_motion)
+        self.canvas.bind("<Leave>", lambda e: self._set_hover(None))
+        self.canvas.bind("<MouseWheel>", self._on_mouse_wheel)
+        self.canvas.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.canvas.yview_scroll(1, "units"))
+        self.canvas.config(yscrollincrement=self.ROW_HEIGHT)
+
+    def pack(self, **kwargs):
+        self.canvas.pack(**kwargs)
+
+    def set_rows(self, rows, empty_text="", number_of=None):
+        """设置要显示的任务并刷新（只重绘可见行）；number_of(task) 返回行首显示的序号"""
+        self.rows = rows
+        self.empty_text = empty_text
+        self.number_of = number_of
+        self._update_scrollregion()
+        self._redraw()
+
+    def set_empty_text(self, empty_text):
+        """修改没有任务时显示的提示"""
+        self.empty_text = empty_text
+        if not self.rows:
+            self._redraw()
+
+    def set_height_in_rows(self, row_count):
+        """按行数设置列表高度"""
+        self.canvas.config(height=row_count * self.ROW_HEIGHT + self.PAD_Y)
+
+    # -------------------------- 增量更新 --------------------------
+    # rows 是由调用方维护的序列（任务列表或状态索引视图），数据变化后调用以下方法通知视图
+    def rows_inserted(self, row):
+        """第 row 行插入了一个任务，只重绘受影响的可见行"""
+        self._rows_shifted(row, 1)
+
+    def rows_removed(self, row):
+        """第 row 行的任务已被删除，只重绘受影响的可见行"""
+        self._rows_shifted(row, -1)
+
+    def refresh_task(self, task):
+        """任务内容变化时，只在其处于视口内时重绘对应的一行"""
+        for slot, slot_row in enumerate(self._slot_rows):
+            if slot_row is not None and slot_row < len(self.rows) and self.rows[slot_row] is task:
+                self._draw_row(slot, slot_row)
+                return
+
+    def _rows_shifted(self, row, delta):
+        """行数变化后更新滚动区域；变化发生在视口上方时同步滚动，保持可见内容位置不变"""
+        start, end = self._visible_range()
+        self._update_scrollregion()
+        if len(self.rows) - delta == 0 or len(self.rows) == 0:
+            # 在空列表和非空列表之间切换，需要切换空提示
+            self._redraw()
+        elif row < start:
+            # 视口上方的行数变化：滚动同样的行数（滚动回调会重绘可见行的序号）
+            self.canvas.yview_scroll(delta, "units")
+        elif row < end + max(delta, 0):
+            # 变化发生在视口内：只重绘该行及其后的可见行
+            self._redraw(from_row=row)
+
+    # -------------------------- 绘制 --------------------------
+    def _update_scrollregion(self):
+        total_height = max(1, len(self.rows)) * self.ROW_HEIGHT + 2 * self.PAD_Y
+        self.canvas.config(scrollregion=(0, 0, self.canvas.winfo_width(), total_height))
+
+    def _on_yscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self._redraw()
+
+    def _visible_range(self):
+        """返回视口内可见行的 [起始, 结束) 行号"""
+        top = self.canvas.canvasy(0)
+        height = self.canvas.winfo_height()
+        start = max(0, int((top - self.PAD_Y) // self.ROW_HEIGHT))
+        end = min(len(self.rows), int((top + height - self.PAD_Y) // self.ROW_HEIGHT) + 1)
+        return start, end
+
+    def _ensure_pool(self, count):
+        """确保至少有 count 组行图元"""
+        while len(self._pool) < count:
+            items = (
+                self.canvas.create_text(0, 0, anchor="nw", fill="#333333", font=self.BOLD_FONT),
+                self.canvas.create_text(0, 0, anchor="nw", font=self.BOLD_FONT),
+                self.canvas.create_text(0, 0, anchor="nw", text="】", fill="#333333", font=self.FONT),
+                self.canvas.create_text(0, 0, anchor="nw", fill=self.TITLE_COLOR, font=self.FONT + ("underline",)),
+            )
+            self._pool.append(items)
+            self._slot_rows.append(None)
+
+    def _redraw(self, from_row=0):
+        """把图元槽重新绑定到当前可见的行（from_row 之前的行保持不变）"""
+        if not self.rows:
+            self.canvas.itemconfig(self._empty_item, text=self.empty_text, state="normal")
+            for slot in range(len(self._pool)):
+                self._hide_slot(slot)
+            return
+        self.canvas.itemconfig(self._empty_item, state="hidden")
+        start, end = self._visible_range()
+        self._ensure_pool(end - start)
+        for slot in range(len(self._pool)):
+            row = start + slot
+            if row < from_row and self._slot_rows[slot] == row:
+                continue
+            if row < end:
+                self._draw_row(slot, row)
+            else:
+                self._hide_slot(slot)
+
+    def _hide_slot(self, slot):
+        for item in self._pool[slot]:
+            self.canvas.itemconfig(item, state="hidden")
+        self._slot_rows[slot] = None
 
-# ========================== 项目文件夹管理函数 ==========================
-def sanitize_filename(filename):
-    """清理文件名，移除非法字符"""
-    # Windows文件名非法字符: \ / : * ? " < > |
-    illegal_chars = r'[\\/*?:"<>|]'
-    import re
-    return re.sub(illegal_chars, '_', filename)
+    def _draw_row(self, slot, row):
+        """在图元槽 slot 上绘制第 row 行"""
+        task = self.rows[row]
+        index_item, status_item, end_item, title_item = self._pool[slot]
+        y = self.PAD_Y + row * self.ROW_HEIGHT
+        status = "已完成" if task.completed else "未完成"
+        status_color = "#00C851" if task.completed else "#FF6D00"
+        title_color = self.TITLE_HOVER_COLOR if row == self._hover_row else self.TITLE_COLOR
+        number = self.number_of(task) if self.number_of else row + 1
+        x = self.PAD_X
+        for item, text, color in ((index_item, f"{number}. 【", None),
+                                  (status_item, status, status_color),
+                                  (end_item, None, None),
+                                  (title_item, task.title if task.title else "无标题任务", title_color)):
+            options = {"state": "normal"}
+            if item is title_item:
+                # 每行只有一行高，过长的标题按画布宽度截断并以省略号结尾
+                text = self._fit_text(text, self.canvas.winfo_width() - self.PAD_X - x)
+            if text is not None:
+                options["text"] = text
+            if color is not None:
+                options["fill"] = color
+            self.canvas.itemconfig(item, **options)
+            self.canvas.coords(item, x, y)
+            x = self.canvas.bbox(item)[2]
+        self._slot_rows[slot] = row
 
-def create_project_folder(task_index, task_title):
-    """为任务创建项目文件夹"""
-    # 确保项目根目录存在
-    os.makedirs(PROJECTS_ROOT, exist_ok=True)
-    
-    # 清理任务标题，用于文件夹名
-    safe_title = sanitize_filename(task_title)
-    if not safe_title or safe_title.isspace():
-        safe_title = f"任务{task_index+1}"
-    
-    # 创建文件夹名
-    folder_name = f"项目{task_index+1}_{safe_title[:50]}"  # 限制长度
-    project_path = os.path.join(PROJECTS_ROOT, folder_name)
-    
-    # 如果文件夹已存在，添加数字后缀
-    counter = 1
-    original_path = project_path
-    while os.path.exists(project_path):
-        project_path = f"{original_path}_{counter}"
-        counter += 1
-    
-    # 创建项目文件夹和子文件夹
-    try:
-        os.makedirs(project_path)
-        os.makedirs(os.path.join(project_path, "images"))
-        os.makedirs(os.path.join(project_path, "videos"))
-        os.makedirs(os.path.join(project_path, "files"))
-        os.makedirs(os.path.join(project_path, "docs"))
-        
-        # 创建项目信息文件
-        info_file = os.path.join(project_path, "project_info.txt")
-        import datetime
-        with open(info_file, "w", encoding="utf-8") as f:
-            f.write(f"项目名称: {task_title}\n")
-            f.write(f"创建时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"任务索引: {task_index}\n")
-            f.write(f"原始标题: {task_title}\n")
-        
-        return project_path
-    except Exception as e:
-        print(f"创建项目文件夹失败: {e}")
-        return None
+    def _fit_text(self, text, width):
+        """把文字截断到不超过 width 像素（超出时以省略号结尾）"""
+        measure = self._title_font.measure
+        if width <= 0 or measure(text) <= width:
+            return text
+        # 二分查找能放下的最长前缀
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if measure(text[:mid] + "…") <= width:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low] + "…"
 
-def copy_file_to_project(original_path, project_path, file_type="files"):
-    """将文件复制到项目文件夹"""
-    if not os.path.exists(original_path):
-        return None
-    
-    try:
-        # 获取文件名和扩展名
-        filename = os.path.basename(original_path)
-        name, ext = os.path.splitext(filename)
-        
-        # 确定目标文件夹
-        if file_type == "images":
-            target_dir = os.path.join(project_path, "images")
-        elif file_type == "videos":
-            target_dir = os.path.join(project_path, "videos")
-        elif file_type == "docs":
-            target_dir = os.path.join(project_path, "docs")
-        else:
-            target_dir = os.path.join(project_path, "files")
-        
-        # 确保目标文件夹存在
-        os.makedirs(target_dir, exist_ok=True)
-        
-        # 生成目标路径
-        target_path = os.path.join(target_dir, filename)
-        
-        # 如果文件已存在，添加数字后缀
-        counter = 1
-        original_target = target_path
-        while os.path.exists(target_path):
-            target_path = os.path.join(target_dir, f"{name}_{counter}{ext}")
-            counter += 1
-        
-        # 复制文件
-        import shutil
-        shutil.copy2(original_path, target_path)
-        
-        return target_path
-    except Exception as e:
-        print(f"复制文件失败: {e}")
+    # -------------------------- 鼠标事件 --------------------------
+    def _row_at(self, event):
+        """根据鼠标位置计算所在行号，不在任何行上时返回None"""
+        row = int((self.canvas.canvasy(event.y) - self.PAD_Y) // self.ROW_HEIGHT)
+        if 0 <= row < len(self.rows):
+            return row
         return None
 
-def get_file_type_from_extension(filepath):
-    """根据文件扩展名确定文件类型"""
-    ext = os.path.splitext(filepath)[1].lower()
-    image_exts = ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp']
-    video_exts = ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm']
-    doc_exts = ['.doc', '.docx', '.pdf', '.txt', '.xls', '.xlsx', '.ppt', '.pptx']
-    
-    if ext in image_exts:
-        return "images"
-    elif ext in video_exts:
-        return "videos"
-    elif ext in doc_exts:
-        return "docs"
-    else:
-        return "files"
+    def _title_hit(self, event, row):
+        """判断鼠标是否落在该行的标题上"""
+        if row is None or row not in self._slot_rows:
+            return False
+        title_item = self._pool[self._slot_rows.index(row)][3]
+        x1, _, x2, _ = self.canvas.bbox(title_item)
+        return x1 <= self.canvas.canvasx(event.x) <= x2
 
-def migrate_existing_files(task_index, project_path, img_paths, video_paths, file_paths):
-    """迁移现有文件到项目文件夹"""
-    migrated_img_paths = []
-    migrated_video_paths = []
-    migrated_file_paths = []
-    
-    # 迁移图片
-    for img_path in img_paths:
-        if os.path.exists(img_path):
-            new_path = copy_file_to_project(img_path, project_path, "images")
-            if new_path:
-                migrated_img_paths.append(new_path)
-        else:
-            migrated_img_paths.append(img_path)
-    
-    # 迁移视频
-    for video_path in video_paths:
-        if os.path.exists(video_path):
-            new_path = copy_file_to_project(video_path, project_path, "videos")
-            if new_path:
-                migrated_video_paths.append(new_path)
-        else:
-            migrated_video_paths.append(video_path)
-    
-    # 迁移文件
-    for file_path in file_paths:
-        if os.path.exists(file_path):
-            file_type = get_file_type_from_extension(file_path)
-            new_path = copy_file_to_project(file_path, project_path, file_type)
-            if new_path:
-                migrated_file_paths.append(new_path)
+    def _on_click(self, event):
+        row = self._row_at(event)
+        if self._title_hit(event, row):
+            self.on_task_click(self.rows[row])
+
+    def _on_motion(self, event):
+        row = self._row_at(event)
+        self._set_hover(row if self._title_hit(event, row) else None)
+
+    def _set_hover(self, row):
+        if row == self._hover_row:
+            return
+        for slot, slot_row in enumerate(self._slot_rows):
+            if slot_row is not None and slot_row in (row, self._hover_row):
+                color = self.TITLE_HOVER_COLOR if slot_row == row else self.TITLE_COLOR
+                self.canvas.itemconfig(self._pool[slot][3], fill=color)
+        self._hover_row = row
+        self.canvas.config(cursor="hand2" if row is not None else "")
+
+    def _on_mouse_wheel(self, event):
+        if event.delta > 0:
+            self.canvas.yview_scroll(-1, "units")
         else:
-            migrated_file_paths.append(file_path)
-    
-    return migrated_img_paths, migrated_video_paths, migrated_file_paths
+            self.canvas.yview_scroll(1, "units")
+        return "break"
 
 # ========================== 主界面UI更新函数 ==========================
 def update_main_ui():
-    """更新主界面"""
-    global todo_list, task_text_widget, hide_completed
-    if not task_text_widget:
+    """更新主界面（只重绘可见行，刷新耗时与窗口高度相关而与任务总数无关）"""
+    global todo_list, task_list_view, hide_completed, search_match_count
+    if not task_list_view:
         return
     
-    task_text_widget.config(state=tk.NORMAL)
-    task_text_widget.delete(1.0, tk.END)
-    
-    if not todo_list:
-        task_text_widget.insert(tk.END, "📌 暂无待办任务，快去添加吧！\n", "empty")
-        display_count = 1
+    number_of = None
+    if search_query:
+        empty_text = "🔍 没有找到匹配的任务"
+        rows, search_match_count = search_index.search(search_query, SEARCH_RESULT_LIMIT, hide_completed)
+        if rows is None:
+            rows, empty_text = [], "⏳ 正在建立搜索索引，请稍候…"
+        # 搜索结果按相关度排序，序号显示任务在列表中的实际序号，与删除、修改等按序号的操作一致
+        number_of = lambda task: status_index.position(task) + 1
     else:
-        display_index = 1
-        actual_task_indices = []
-        
-        for i, task in enumerate(todo_list):
-            parts = task.split("|")
-            title = parts[0] if parts[0] else "无标题任务"
-            status = "已完成" if (len(parts)>=2 and parts[1]=="True") else "未完成"
-            
-            if hide_completed and status == "已完成":
-                continue
-                
-            status_tag = "completed" if status == "已完成" else "uncompleted"
-            
-            task_text_widget.insert(tk.END, f"{display_index}. 【", "index")
-            task_text_widget.insert(tk.END, status, status_tag)
-            task_text_widget.insert(tk.END, f"】", "title_end")
-            task_text_widget.insert(tk.END, title, f"title_clickable_{i}")
-            task_text_widget.insert(tk.END, "\n", "newline")
-            
-            actual_task_indices.append(i)
-            display_index += 1
-            
-        if display_index == 1 and hide_completed:
-            task_text_widget.insert(tk.END, "📌 暂无未完成的任务，太棒了！\n", "empty")
-            display_count = 1
+        if not todo_list:
+            empty_text = "📌 暂无待办任务，快去添加吧！"
         else:
-            display_count = display_index - 1
-            
-        for i, actual_index in enumerate(actual_task_indices):
-            def make_click_func(idx):
-                def click_func(event):
-                    show_task_detail_by_index(actual_task_indices[idx])
-                return click_func
-            
-            tag_name = f"title_clickable_{actual_index}"
-            task_text_widget.tag_config(tag_name, foreground="#1a73e8", font=("微软雅黑", 11), underline=True)
-            task_text_widget.tag_bind(tag_name, "<Button-1>", make_click_func(i))
-            task_text_widget.tag_bind(tag_name, "<Enter>", lambda e, t=tag_name: task_text_widget.tag_config(t, foreground="#0d47a1"))
-            task_text_widget.tag_bind(tag_name, "<Leave>", lambda e, t=tag_name: task_text_widget.tag_config(t, foreground="#1a73e8"))
-    
-    task_text_widget.tag_config("empty", foreground="#666666", font=("微软雅黑", 11))
-    task_text_widget.tag_config("index", foreground="#333333", font=("微软雅黑", 11, "bold"))
-    task_text_widget.tag_config("completed", foreground="#00C851", font=("微软雅黑", 11, "bold"))
-    task_text_widget.tag_config("uncompleted", foreground="#FF6D00", font=("微软雅黑", 11, "bold"))
-    task_text_widget.tag_config("title_end", foreground="#333333", font=("微软雅黑", 11))
-    task_text_widget.tag_config("newline", font=("微软雅黑", 11))
-    
-    task_text_widget.config(state=tk.DISABLED)
-    
+            empty_text = "📌 暂无未完成的任务，太棒了！"
+        # 隐藏已完成任务时直接使用状态索引中的未完成集合，不需要逐个筛选
+        rows = status_index.view(False) if hide_completed else todo_list
+    task_list_view.set_rows(rows, empty_text, number_of)
+    fit_main_list_height()
+    update_task_counts()
+
+def fit_main_list_height():
+    """根据显示的任务数调整列表高度"""
+    display_count = max(1, len(task_list_view.rows))
     min_lines = 3
     max_lines = 15
     target_lines = max(min_lines, min(display_count + 1, max_lines))
-    task_text_widget.config(height=target_lines)
+    task_list_view.set_height_in_rows(target_lines)
+
+def update_task_counts():
+    """更新主界面的任务计数"""
+    if task_count_label:
+        text = f"未完成 {status_index.count(False)}  ·  已完成 {status_index.count(True)}"
+        if search_query and not search_index.ready:
+            text = f"正在建立搜索索引…  ·  {text}"
+        elif search_query:
+            shown = f"（显示前 {SEARCH_RESULT_LIMIT} 个）" if search_match_count > SEARCH_RESULT_LIMIT else ""
+            text = f"搜索到 {search_match_count} 个任务{shown}  ·  {text}"
+        task_count_label.config(text=text)
+
+_pending_removed_row = None  # 正在删除的任务在主界面中的行号
+
+def on_task_model_change(event, task, fields):
+    """任务变更时增量更新主界面列表，只修改受影响的行"""
+    global _pending_removed_row
+    if not task_list_view:
+        return
+    if search_query:
+        # 搜索结果按相关度排序，任务变化后重新搜索（搜索走倒排索引，代价很小）
+        if event != "removing":
+            update_main_ui()
+        return
+    shown = not (hide_completed and task.completed)
+    # 行号由状态索引二分查找得到，不扫描列表
+    row_of = lambda t: status_index.rank(t, False) if hide_completed else status_index.position(t)
+    if event == "inserted":
+        if not shown:
+            return
+        task_list_view.set_empty_text("📌 暂无未完成的任务，太棒了！")
+        task_list_view.rows_inserted(row_of(task))
+    elif event == "removing":
+        # 任务仍在列表和索引中，先记下它的行号
+        _pending_removed_row = row_of(task) if shown else None
+    elif event == "removed":
+        if _pending_removed_row is not None:
+            task_list_view.rows_removed(_pending_removed_row)
+            _pending_removed_row = None
+        if not todo_list:
+            task_list_view.set_empty_text("📌 暂无待办任务，快去添加吧！")
+    elif event == "updated":
+        if "completed" in fields and hide_completed:
+            # 隐藏已完成任务时，状态变化意味着该行要出现或消失；状态索引已更新，
+            # 新完成的任务在未完成集合中的插入位置就是它原来所在的行
+            if task.completed:
+                task_list_view.rows_removed(status_index.rank(task, False))
+            else:
+                task_list_view.rows_inserted(row_of(task))
+        elif "title" in fields or "completed" in fields:
+            task_list_view.refresh_task(task)
+    fit_main_list_height()
+    update_task_counts()
+
+_search_timer = None  # 搜索框输入防抖定时器
+
+def set_search_query(query):
+    """设置搜索词并刷新主界面列表（空字符串表示退出搜索）"""
+    global search_query
+    query = query.strip()
+    if query == search_query:
+        return
+    search_query = query
+    update_main_ui()
+    task_list_view.canvas.yview_moveto(0)
+
+def create_search_bar(parent):
+    """创建主界面搜索栏：输入停顿后按标题和事项日志搜索，回车打开第一个结果，Esc清空"""
+    search_bar = tk.Frame(parent, bg="#f5f5f5", padx=15)
+    search_bar.pack(fill=tk.X, pady=(10, 0))
+    
+    tk.Label(search_bar, text="🔍", bg="#f5f5f5", font=("微软雅黑", 12)).pack(side=tk.LEFT)
+    search_var = tk.StringVar()
+    search_entry = tk.Entry(search_bar, textvariable=search_var, font=("微软雅黑", 12),
+                            bd=1, relief=tk.SOLID)
+    search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5, ipady=3)
+    
+    def run_search():
+        global _search_timer
+        _search_timer = None
+        set_search_query(search_var.get())
+    
+    def on_search_changed(*args):
+        global _search_timer
+        if _search_timer is not None:
+            search_entry.after_cancel(_search_timer)
+        _search_timer = search_entry.after(SEARCH_DELAY, run_search)
+    
+    def clear_search(event=None):
+        global _search_timer
+        if _search_timer is not None:
+            search_entry.after_cancel(_search_timer)
+            _search_timer = None
+        search_var.set("")
+        set_search_query("")
+    
+    def open_first_result(event=None):
+        run_search()
+        if search_query and task_list_view.rows:
+            on_task_row_click(task_list_view.rows[0])
+    
+    search_var.trace_add("write", on_search_changed)
+    search_entry.bind("<Return>", open_first_result)
+    search_entry.bind("<Escape>", clear_search)
+    
+    clear_btn = tk.Button(search_bar, text="✕", command=clear_search, bg="#f5f5f5",
+                          fg="#666666", bd=0, font=("微软雅黑", 11), cursor="hand2")
+    clear_btn.pack(side=tk.LEFT)
+    return search_entry
+
+def on_task_row_click(task):
+    """点击主界面任务标题时打开详情"""
+    show_task_detail_by_index(status_index.position(task))
 
 # -------------------------- 查看待办详情 --------------------------
+def migrate_task_attachments(task, on_done):
+    """任务刚有项目文件夹时，在后台把它已有的附件迁移进去，期间显示进度窗口
+
+    迁移成功后更新并保存任务的附件路径，再调用 on_done()（任务在此期间被删除时不调用）。
+    迁移失败或程序中途退出时项目文件夹中的清单文件会保留，下次打开该任务时继续迁移。
+    """
+    engine = MigrationEngine(task.project_path)
+    try:
+        engine.mark_started()
+    except OSError as e:
+        messagebox.showerror("错误", f"迁移附件失败：{str(e)}", parent=root_window)
+        return
+    result = queue.Queue()
+    
+    def worker():
+        try:
+            result.put((migrate_existing_files(task.project_path, task.img_paths, task.video_paths,
+                                               task.file_paths, engine), None))
+        except Exception as e:
+            result.put((None, e))
+    
+    # 进度窗口
+    progress_win = tk.Toplevel(root_window)
+    progress_win.title("迁移附件")
+    progress_win.geometry("380x120")
+    progress_win.resizable(False, False)
+    progress_win.transient(root_window)
+    progress_win.protocol("WM_DELETE_WINDOW", lambda: None)  # 迁移完成前不能关闭
+    progress_label = tk.Label(progress_win, text="正在把已有附件复制到项目文件夹…", font=("微软雅黑", 10))
+    progress_label.pack(pady=(20, 8))
+    progress_bar = ttk.Progressbar(progress_win, mode="determinate", maximum=1000, length=320)
+    progress_bar.pack()
+    progress_win.grab_set()
+    
+    def poll():
+        try:
+            migrated, error = result.get_nowait()
+        except queue.Empty:
+            if engine.total_files:
+                mb = 1024 * 1024
+                progress_label.config(text=f"正在复制附件：{engine.copied_files} / {engine.total_files} 个文件  "
+                                           f"{engine.copied_bytes / mb:.1f} / {engine.total_bytes / mb:.1f} MB")
+                progress_bar["value"] = 1000 * engine.copied_bytes // max(1, engine.total_bytes)
+            root_window.after(100, poll)
+            return
+        progress_win.destroy()
+        if error is not None:
+            messagebox.showerror("错误", f"迁移附件失败：{str(error)}\n下次打开该任务时会继续迁移。",
+                                 parent=root_window)
+            return
+        if get_task(task.id) is task:
+            task.img_paths, task.video_paths, task.file_paths = (list(paths) for paths in migrated)
+            save_task_change(task, "img_paths", "video_paths", "file_paths")
+            on_done()
+    
+    threading.Thread(target=worker, name="migrate-attachments", daemon=True).start()
+    root_window.after(100, poll)
+
 def show_task_detail_by_index(actual_index):
     """根据实际索引查看待办详情"""
     global todo_list, root_window
@@ -497,30 +3514,36 @@ def show_task_detail_by_index(actual_index):
             messagebox.showerror("错误", "序号不存在！", parent=root_window)
             return
         
-        # 解析任务数据（扩展为7个字段）
-        task_parts = todo_list[index].split("|")
-        task_parts = task_parts + [""] * (7 - len(task_parts))
-        title, status, comment, img_paths_str, video_paths_str, file_paths_str, project_path = task_parts[0], task_parts[1], task_parts[2], task_parts[3], task_parts[4], task_parts[5], task_parts[6]
-        title = title if title.strip() else "无标题任务"
-        status = status if status in ["True", "False"] else "False"
-        comment = comment if comment.strip() else "无批注内容，直接输入后点击保存即可"
+        task = todo_list[index]
+        title = task.title if task.title.strip() else "无标题任务"
+        comment = task.comment if task.comment.strip() else "无批注内容，直接输入后点击保存即可"
+        project_path = task.project_path
         
-        # 解析路径列表
-        img_paths = parse_path_list(img_paths_str)
-        video_paths = parse_path_list(video_paths_str)
-        file_paths = parse_path_list(file_paths_str)
+        # 附件按原样传给详情窗口，是否存在由详情窗口在后台检查并标记为缺失，
+        # 这样暂时不可访问（如移动硬盘未连接）的附件不会在保存时被丢掉
+        img_paths = list(task.img_paths)
+        video_paths = list(task.video_paths)
+        file_paths = list(task.file_paths)
         
         # 如果项目文件夹不存在，尝试创建
+        needs_migration = False
         if not project_path or not os.path.exists(project_path):
-            project_path = create_project_folder(index, title)
+            project_path = create_project_folder(task.id, title)
             if project_path:
                 # 更新项目文件夹路径
-                task_parts[6] = project_path
-                todo_list[index] = "|".join(task_parts)
-                save_todo()
+                task.project_path = project_path
+                save_task_change(task, "project_path")
+                needs_migration = bool(task.img_paths or task.video_paths or task.file_paths)
+        elif os.path.exists(os.path.join(project_path, MigrationEngine.MANIFEST_FILE)):
+            # 上次迁移被中断或失败，继续迁移（已复制完成的文件按清单跳过）
+            needs_migration = True
+        if needs_migration:
+            # 先把已有的附件迁移到项目文件夹，完成后再打开详情窗口
+            migrate_task_attachments(task, lambda: show_task_detail_by_index(status_index.position(task)))
+            return
         
         # 调用详情窗口创建函数，传递项目文件夹路径
-        create_detail_window(index, title, status, comment, img_paths, video_paths, file_paths, project_path)
+        create_detail_window(index, title, task.completed, comment, img_paths, video_paths, file_paths, project_path)
         
     except Exception as e:
         messagebox.showerror("错误", f"打开待办详情失败：{str(e)}", parent=root_window)
@@ -549,20 +3572,20 @@ def show_task_detail():
     except Exception as e:
         messagebox.showerror("错误", f"打开待办详情失败：{str(e)}", parent=root_window)
 
-def create_detail_window(index, title, status, comment, img_paths, video_paths, file_paths, project_path=None):
+def create_detail_window(index, title, completed, comment, img_paths, video_paths, file_paths, project_path=None):
     """创建任务详情窗口（核心UI构建逻辑）- 扩展支持多图片、多视频、多文件附件和项目文件夹"""
     global todo_list, root_window
     
+    # 详情窗口内的所有操作直接作用于该任务记录
+    task = todo_list[index]
+    
     # 如果项目文件夹不存在，尝试创建
     if not project_path or not os.path.exists(project_path):
-        project_path = create_project_folder(index, title)
+        project_path = create_project_folder(task.id, title)
         if project_path:
             # 更新项目文件夹路径
-            task_parts = todo_list[index].split("|")
-            task_parts = task_parts + [""] * (7 - len(task_parts))
-            task_parts[6] = project_path
-            todo_list[index] = "|".join(task_parts)
-            save_todo()
+            task.project_path = project_path
+            save_task_change(task, "project_path")
     
     # 加载保存的详情窗口配置
     saved_detail_geometry = load_detail_window_config()
@@ -593,15 +3616,28 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
     # 绑定窗口大小变化事件
     detail_win.bind("<Configure>", on_detail_window_resize)
     
+    # 缩略图在后台解码，窗口关闭时取消未完成的任务
+    thumbnail_loader = ThumbnailLoader(detail_win)
+    
     # 详情窗口关闭协议处理函数
     def on_detail_window_close():
         # 保存窗口配置
         save_detail_window_config(detail_win)
-        # 销毁窗口
+        # 销毁窗口（后台任务在 on_detail_window_destroy 中停止）
         detail_win.destroy()
     
+    # 窗口以任何方式销毁时停止后台任务（子控件销毁也会触发，只处理窗口本身）
+    def on_detail_window_destroy(event):
+        if event.widget is not detail_win:
+            return
+        # 停止加载缩略图
+        thumbnail_loader.close()
+        # 取消尚未完成的附件导入（已复制完成的文件仍会记入任务）
+        attachment_importer.close()
+    
     # 设置窗口关闭协议
     detail_win.protocol("WM_DELETE_WINDOW", on_detail_window_close)
+    detail_win.bind("<Destroy>", on_detail_window_destroy, add="+")
 
     # 主滚动容器
     main_canvas = tk.Canvas(detail_win, bg="#f8fafc", bd=0, highlightthickness=0)
@@ -640,6 +3676,57 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
     # 布局主滚动容器
     main_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=1, pady=1)
     main_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    
+    # -------------------------- 附件导入进度（固定在窗口底部，导入时显示） --------------------------
+    import_frame = tk.Frame(detail_win, bg="#f1f5f9", padx=15, pady=8)
+    import_file_label = tk.Label(import_frame, text="", bg="#f1f5f9", fg="#475569",
+                                 font=("微软雅黑", 9), anchor="w")
+    import_file_label.grid(row=0, column=0, sticky="w")
+    import_file_bar = ttk.Progressbar(import_frame, mode="determinate", maximum=1000)
+    import_file_bar.grid(row=1, column=0, sticky="ew", pady=(2, 6))
+    import_total_label = tk.Label(import_frame, text="", bg="#f1f5f9", fg="#475569",
+                                  font=("微软雅黑", 9), anchor="w")
+    import_total_label.grid(row=2, column=0, sticky="w")
+    import_total_bar = ttk.Progressbar(import_frame, mode="determinate", maximum=1000)
+    import_total_bar.grid(row=3, column=0, sticky="ew", pady=(2, 0))
+    import_cancel_btn = tk.Button(import_frame, text="取消导入", bg="#ef4444", fg="#ffffff",
+                                  font=("微软雅黑", 9, "bold"), relief=tk.FLAT, padx=12, pady=4,
+                                  command=lambda: attachment_importer.cancel())
+    import_cancel_btn.grid(row=0, column=1, rowspan=4, padx=(15, 0))
+    import_frame.columnconfigure(0, weight=1)
+    
+    def show_import_progress(state):
+        if not import_frame.winfo_exists():
+            return
+        if state is None:
+            import_frame.pack_forget()
+            return
+        if not import_frame.winfo_ismapped():
+            import_frame.pack(side=tk.BOTTOM, fill=tk.X, before=main_canvas)
+        mb = 1024 * 1024
+        if state["file_name"]:
+            import_file_label.config(text=f"正在复制：{state['file_name']}  "
+                                          f"{state['file_done'] / mb:.1f} / {state['file_size'] / mb:.1f} MB")
+        import_file_bar["value"] = 1000 * state["file_done"] // max(1, state["file_size"])
+        import_total_label.config(text=f"总进度：{state['done_files']} / {state['total_files']} 个文件  "
+                                       f"{state['done_bytes'] / mb:.1f} / {state['total_bytes'] / mb:.1f} MB")
+        import_total_bar["value"] = 1000 * state["done_bytes"] // max(1, state["total_bytes"])
+    
+    # 附件在后台线程中复制到项目文件夹，每个文件复制完成后才记入任务
+    attachment_importer = AttachmentImporter(show_import_progress, task.id)
+    
+    def show_import_result(frame, done, cancelled, unit):
+        """一批附件导入结束后在对应功能区显示提示"""
+        if not frame.winfo_exists():
+            return
+        if cancelled:
+            text, bg, fg = f"已取消导入，已完成 {done} {unit}", "#fef3c7", "#92400e"
+        else:
+            text, bg, fg = f"✓ 已添加 {done} {unit}到项目文件夹", "#d1fae5", "#065f46"
+        result_label = tk.Label(frame, text=text, bg=bg, fg=fg,
+                                font=("微软雅黑", 9, "bold"), padx=10, pady=5)
+        result_label.place(relx=0.5, rely=0.92, anchor="center")
+        frame.after(2000, result_label.destroy)
 
     # 主卡片容器（现代化卡片设计）
     main_card = tk.Frame(main_scrollable_frame, bg="#ffffff", bd=0, 
@@ -667,8 +3754,8 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
     meta_frame.pack(fill=tk.X)
     
     # 状态标签（现代化胶囊样式）
-    status_text = "已完成" if status == "True" else "未完成"
-    status_bg = "#10b981" if status == "True" else "#f97316"  # 更现代化的颜色
+    status_text = "已完成" if completed else "未完成"
+    status_bg = "#10b981" if completed else "#f97316"  # 更现代化的颜色
     status_frame = tk.Frame(meta_frame, bg=status_bg, bd=0, relief=tk.FLAT)
     status_frame.pack(side=tk.LEFT, padx=(0, 15))
     status_label = tk.Label(status_frame, text=f"  {status_text}  ", bg=status_bg, fg="#ffffff",
@@ -700,7 +3787,7 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
     comment_hide_btn.pack(side=tk.RIGHT)
     
     # 加载保存的隐藏状态
-    hide_states = load_hide_state(index)
+    hide_states = load_hide_state(task.id)
     comment_hidden = hide_states[0] == "1"
     img_hidden = hide_states[1] == "1"
     video_hidden = hide_states[2] == "1"
@@ -781,7 +3868,7 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
             button_container.pack(fill=tk.X, pady=(15, 0))
         
         # 保存隐藏状态
-        save_hide_state(index, [
+        save_hide_state(task.id, [
             "1" if comment_hidden else "0",
             "1" if img_hidden else "0",
             "1" if video_hidden else "0",
@@ -863,11 +3950,8 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
     def save_comment_func():
         try:
             new_comment = comment_text.get(1.0, tk.END).strip()
-            task_parts = todo_list[index].split("|")
-            task_parts = task_parts + [""] * (7 - len(task_parts))
-            task_parts[2] = new_comment
-            todo_list[index] = "|".join(task_parts)
-            save_todo()
+            task.comment = new_comment
+            save_task_change(task, "comment")
             # 现代化成功提示
             success_label = tk.Label(comment_frame, text="✓ 批注已保存", bg="#d1fae5", fg="#065f46",
                                     font=("微软雅黑", 9, "bold"), padx=10, pady=5)
@@ -936,7 +4020,7 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
             img_btn_frame.pack(fill=tk.X)
         
         # 保存隐藏状态
-        save_hide_state(index, [
+        save_hide_state(task.id, [
             "1" if comment_hidden else "0",
             "1" if img_hidden else "0",
             "1" if video_hidden else "0",
@@ -979,63 +4063,85 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
     thumbnail_canvas.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
     thumbnail_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
     
-    # 存储缩略图引用
-    thumbnail_images = []
-    
-    # 加载和显示缩略图
-    def load_thumbnails():
-        # 清空现有缩略图
-        for widget in thumbnail_scrollable_frame.winfo_children():
-            widget.destroy()
-        thumbnail_images.clear()
+    # 创建单个图片缩略图（内存中已有时直接显示，否则先显示占位并在后台解码）
+    def make_image_tile(parent, img_path, i):
+        # 创建缩略图框架
+        thumb_frame = tk.Frame(parent, bg="#ffffff", bd=1, relief=tk.SOLID)
+        thumb_frame.pack(side=tk.LEFT, padx=5, pady=5)
         
-        if not img_paths:
-            # 显示无图片提示
-            no_img_label = tk.Label(thumbnail_scrollable_frame, text="暂无图片", bg="#f8fafc", fg="#cbd5e1",
-                                   font=("微软雅黑", 12), padx=20, pady=50)
-            no_img_label.pack()
-            return
+        # 创建缩略图标签
+        thumb_label = tk.Label(thumb_frame, bg="#ffffff", cursor="hand2")
+        thumb_label.pack(padx=5, pady=5)
         
-        for i, img_path in enumerate(img_paths):
-            # 创建缩略图框架
-            thumb_frame = tk.Frame(thumbnail_scrollable_frame, bg="#ffffff", bd=1, relief=tk.SOLID)
-            thumb_frame.pack(side=tk.LEFT, padx=5, pady=5)
-            
-            # 创建缩略图标签
-            thumb_label = tk.Label(thumb_frame, bg="#ffffff", cursor="hand2")
-            thumb_label.pack(padx=5, pady=5)
-            
-            # 绑定点击事件查看原图
-            def make_click_func(path=img_path):
-                def click_func(event):
-                    try:
-                        os.startfile(path)
-                    except:
-                        messagebox.showinfo("图片", f"图片路径：{path}", parent=detail_win)
-                return click_func
-            
-            thumb_label.bind("<Button-1>", make_click_func())
-            
-            # 加载缩略图
-            if Image and ImageTk and os.path.exists(img_path):
-                try:
-                    img = Image.open(img_path)
-                    # 创建缩略图
-                    img.thumbnail((100, 100))
-                    tk_img = ImageTk.PhotoImage(img)
-                    thumb_label.config(image=tk_img)
-                    thumb_label.image = tk_img
-                    thumbnail_images.append(tk_img)  # 保持引用
-                    
-                    # 显示文件名
-                    file_name = os.path.basename(img_path)
-                    name_label = tk.Label(thumb_frame, text=file_name[:15] + "..." if len(file_name) > 15 else file_name,
-                                         bg="#ffffff", fg="#475569", font=("微软雅黑", 8))
-                    name_label.pack(pady=(0, 5))
-                except Exception as e:
-                    thumb_label.config(text=f"❌\n加载失败", fg="#ef4444", font=("微软雅黑", 9))
-            else:
-                thumb_label.config(text=f"📷\n{i+1}", fg="#cbd5e1", font=("微软雅黑", 12))
+        # 绑定点击事件查看原图
+        def click_func(event):
+            try:
+                os.startfile(img_path)
+            except:
+                messagebox.showinfo("图片", f"图片路径：{img_path}", parent=detail_win)
+        
+        thumb_label.bind("<Button-1>", click_func)
+        
+        # 先显示内存中已有的缩略图（或占位），文件是否存在、是否被修改都在后台检查
+        has_pil = bool(Image and ImageTk)
+        photo_key = photo_cache_key(img_path, IMAGE_THUMBNAIL_SIZE, THUMBNAIL_DECODE_MODE)
+        cached = photo_image_cache.get(photo_key) if has_pil else None
+        if cached is not None:
+            thumb_label.config(image=cached[0])
+            thumb_label.image = cached[0]  # 保持引用
+        elif has_pil:
+            thumb_label.config(text="⏳\n加载中", fg="#cbd5e1", font=("微软雅黑", 9),
+                               width=12, height=6)
+        else:
+            thumb_label.config(text=f"📷\n{i+1}", fg="#cbd5e1", font=("微软雅黑", 12))
+            thumb_frame.renumber = lambda index: (
+                thumb_label.config(text=f"📷\n{index+1}") if thumb_label.cget("text").startswith("📷") else None)
+        
+        # 显示文件名
+        file_name = os.path.basename(img_path)
+        name_label = tk.Label(thumb_frame, text=file_name[:15] + "..." if len(file_name) > 15 else file_name,
+                             bg="#ffffff", fg="#475569", font=("微软雅黑", 8))
+        name_label.pack(pady=(0, 5))
+        
+        def mark_missing():
+            thumb_label.config(image="", text="⚠️\n文件缺失", fg="#f59e0b", font=("微软雅黑", 9),
+                               width=12, height=6)
+            thumb_label.image = None
+        
+        def done_func(result, error):
+            if not thumb_label.winfo_exists():
+                return
+            if error is not None:
+                thumb_label.config(image="", text=f"❌\n加载失败", fg="#ef4444")
+                thumb_label.image = None
+                return
+            img, st = result
+            if st is None:
+                mark_missing()
+            elif img is not None:
+                tk_img = ImageTk.PhotoImage(img)
+                photo_image_cache.put(photo_key, tk_img, st)
+                thumb_label.config(image=tk_img, text="", width=0, height=0)
+                thumb_label.image = tk_img  # 保持引用
+        
+        def exists_done(st, error):
+            if error is None and st is None and thumb_label.winfo_exists():
+                mark_missing()
+        
+        if has_pil:
+            known_stat = cached[1] if cached is not None else None
+            thumbnail_loader.submit(refresh_image_thumbnail, (img_path, IMAGE_THUMBNAIL_SIZE, known_stat), done_func)
+        else:
+            thumbnail_loader.submit(stat_cache.stat, (img_path,), exists_done)
+        return thumb_frame
+    
+    image_strip = AttachmentStrip(thumbnail_scrollable_frame, make_image_tile, "暂无图片", 50)
+    
+    # 加载和显示全部缩略图
+    def load_thumbnails():
+        # 丢弃上一次未完成的解码
+        thumbnail_loader.reset()
+        image_strip.set_items(img_paths)
     
     # 初始加载缩略图
     load_thumbnails()
@@ -1070,34 +4176,29 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
             filetypes=[("图片文件", "*.png *.jpg *.jpeg *.gif *.bmp *.webp"),
                       ("所有文件", "*.*")]
         )
-        if file_paths:
-            new_img_paths = []
+        if not file_paths:
+            return
+        
+        def image_imported(original_path, copied_path, error):
+            if get_task(task.id) is not task:
+                return  # 导入过程中任务已被删除
+            # 复制失败时与之前一样保留原路径
+            new_path = copied_path or original_path
+            img_paths.append(new_path)
+            task.img_paths = list(img_paths)
+            save_task_change(task, "img_paths")
+            # 更新显示（只为新增的图片创建缩略图）
+            if img_frame.winfo_exists():
+                image_strip.append([new_path])
+        
+        if project_path and os.path.exists(project_path):
+            # 复制文件到项目文件夹
+            attachment_importer.add(file_paths, project_path, "images", image_imported,
+                                    lambda done, cancelled: show_import_result(img_frame, done, cancelled, "张图片"))
+        else:
             for file_path in file_paths:
-                # 复制文件到项目文件夹
-                if project_path and os.path.exists(project_path):
-                    copied_path = copy_file_to_project(file_path, project_path, "images")
-                    if copied_path:
-                        new_img_paths.append(copied_path)
-                    else:
-                        new_img_paths.append(file_path)
-                else:
-                    new_img_paths.append(file_path)
-            
-            # 添加到现有图片列表
-            updated_img_paths = img_paths + new_img_paths
-            task_parts = todo_list[index].split("|")
-            task_parts = task_parts + [""] * (7 - len(task_parts))
-            task_parts[3] = join_path_list(updated_img_paths)
-            todo_list[index] = "|".join(task_parts)
-            save_todo()
-            # 更新显示
-            img_paths[:] = updated_img_paths
-            load_thumbnails()
-            # 成功提示
-            success_label = tk.Label(img_frame, text=f"✓ 已添加 {len(file_paths)} 张图片到项目文件夹", bg="#d1fae5", fg="#065f46",
-                                    font=("微软雅黑", 9, "bold"), padx=10, pady=5)
-            success_label.place(relx=0.5, rely=0.92, anchor="center")
-            detail_win.after(2000, success_label.destroy)
+                image_imported(file_path, None, None)
+            show_import_result(img_frame, len(file_paths), False, "张图片")
 
     # 删除图片按钮
     def del_img_func():
@@ -1137,18 +4238,16 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
             
             # 删除选中的图片
             selected_indices = sorted(selected_indices, reverse=True)  # 从后往前删除
-            for idx in selected_indices:
-                img_paths.pop(idx)
+            removed_paths = [img_paths.pop(idx) for idx in selected_indices]
             
             # 更新数据
-            task_parts = todo_list[index].split("|")
-            task_parts = task_parts + [""] * (7 - len(task_parts))
-            task_parts[3] = join_path_list(img_paths)
-            todo_list[index] = "|".join(task_parts)
-            save_todo()
+            task.img_paths = list(img_paths)
+            save_task_change(task, "img_paths")
+            # 启用内容存储时释放不再被任何任务使用的附件
+            release_attachments(removed_paths)
             
-            # 更新显示
-            load_thumbnails()
+            # 更新显示（只移除被删除图片的缩略图）
+            image_strip.remove(selected_indices)
             del_win.destroy()
             
             # 成功提示
@@ -1211,7 +4310,7 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
             video_btn_frame.pack(fill=tk.X)
         
         # 保存隐藏状态
-        save_hide_state(index, [
+        save_hide_state(task.id, [
             "1" if comment_hidden else "0",
             "1" if img_hidden else "0",
             "1" if video_hidden else "0",
@@ -1254,82 +4353,142 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
     video_thumbnail_canvas.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
     video_thumbnail_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
     
-    # 存储视频缩略图引用
-    video_thumbnail_images = []
-    
-    # 加载和显示视频缩略图
-    def load_video_thumbnails():
-        # 清空现有缩略图
-        for widget in video_thumbnail_scrollable_frame.winfo_children():
-            widget.destroy()
-        video_thumbnail_images.clear()
+    # 创建单个视频缩略图
+    def make_video_tile(parent, video_path, i):
+        # 创建视频缩略图框架
+        video_thumb_frame = tk.Frame(parent, bg="#ffffff", bd=1, relief=tk.SOLID)
+        video_thumb_frame.pack(side=tk.LEFT, padx=5, pady=5)
         
-        if not video_paths:
-            # 显示无视频提示
-            no_video_label = tk.Label(video_thumbnail_scrollable_frame, text="暂无视频", bg="#f8fafc", fg="#cbd5e1",
-                                     font=("微软雅黑", 12), padx=20, pady=70)
-            no_video_label.pack()
-            return
+        # 创建视频缩略图标签
+        video_thumb_label = tk.Label(video_thumb_frame, bg="#1e293b", fg="#ffffff", cursor="hand2")
+        video_thumb_label.pack(padx=5, pady=5)
         
-        for i, video_path in enumerate(video_paths):
-            # 创建视频缩略图框架
-            video_thumb_frame = tk.Frame(video_thumbnail_scrollable_frame, bg="#ffffff", bd=1, relief=tk.SOLID)
-            video_thumb_frame.pack(side=tk.LEFT, padx=5, pady=5)
+        # 绑定双击事件播放视频
+        def click_func(event):
+            try:
+                os.startfile(video_path)
+            except:
+                messagebox.showinfo("视频", f"视频路径：{video_path}", parent=detail_win)
+        
+        video_thumb_label.bind("<Double-1>", click_func)
+        
+        # 没有缩略图时显示的序号需要在删除前面的视频后更新
+        def renumber(index):
+            if not video_thumb_label.cget("image") and video_thumb_label.cget("text").startswith("🎬"):
+                video_thumb_label.config(text=f"🎬\n{index+1}")
+        video_thumb_frame.renumber = renumber
+        
+        # 先显示文件名和内存中已有的缩略图，文件是否存在、大小和截图都在后台获取
+        file_name = os.path.basename(video_path)
+        name_text = f"{file_name[:15]}..." if len(file_name) > 15 else file_name
+        info_label = tk.Label(video_thumb_frame, text=f"{name_text}\n…", bg="#ffffff", fg="#475569",
+                             font=("微软雅黑", 8), wraplength=120, justify="center")
+        info_label.pack(pady=(0, 5))
+        
+        has_pil = bool(Image and ImageTk)
+        photo_key = photo_cache_key(video_path, VIDEO_THUMBNAIL_SIZE, "video")
+        cached = photo_image_cache.get(photo_key) if has_pil else None
+        if cached is not None:
+            video_thumb_label.config(image=cached[0], text="")
+            video_thumb_label.image = cached[0]  # 保持引用
+        elif has_pil:
+            video_thumb_label.config(text="⏳\n加载中", font=("微软雅黑", 9), width=14, height=6)
+        else:
+            # 没有缩略图，显示图标
+            video_thumb_label.config(text=f"🎬\n{i+1}", fg="#cbd5e1", font=("微软雅黑", 16))
+        
+        # 多帧预览：后台生成网格图并切分，完成后鼠标在缩略图上左右移动即切换画面
+        def enable_storyboard():
+            if not VIDEO_STORYBOARD_MODE:
+                return
+            
+            def frames_done(cells, error):
+                if error is not None or len(cells or []) < 2 or not video_thumb_label.winfo_exists():
+                    return
+                frames = [ImageTk.PhotoImage(cell) for cell in cells]
+                video_thumb_label.storyboard_frames = frames  # 保持引用
+                
+                def on_motion(event):
+                    width = max(1, video_thumb_label.winfo_width())
+                    idx = min(len(frames) - 1, max(0, event.x * len(frames) // width))
+                    video_thumb_label.config(image=frames[idx])
+                
+                def on_leave(event):
+                    video_thumb_label.config(image=video_thumb_label.image)
+                
+                video_thumb_label.bind("<Motion>", on_motion)
+                video_thumb_label.bind("<Leave>", on_leave)
             
-            # 创建视频缩略图标签
-            video_thumb_label = tk.Label(video_thumb_frame, bg="#1e293b", fg="#ffffff", cursor="hand2")
-            video_thumb_label.pack(padx=5, pady=5)
+            def storyboard_done(storyboard_path, error):
+                if error is None and storyboard_path and video_thumb_label.winfo_exists():
+                    thumbnail_loader.submit(split_storyboard, (storyboard_path,), frames_done)
             
-            # 绑定双击事件播放视频
-            def make_video_click_func(path=video_path):
-                def click_func(event):
-                    try:
-                        os.startfile(path)
-                    except:
-                        messagebox.showinfo("视频", f"视频路径：{path}", parent=detail_win)
-                return click_func
+            thumbnail_loader.watch(get_video_thumbnail_service().request_storyboard(video_path),
+                                   storyboard_done)
+        
+        def stat_done(video_stat, error):
+            if not video_thumb_label.winfo_exists():
+                return
+            if error is not None or video_stat is None:
+                # 文件缺失（或暂时无法访问），保留路径只做标记
+                video_thumb_label.config(image="", text="⚠️\n文件缺失", fg="#f59e0b",
+                                         font=("微软雅黑", 9), width=14, height=6)
+                video_thumb_label.image = None
+                info_label.config(text=f"{name_text}\n缺失")
+                return
+            info_label.config(text=f"{name_text}\n{video_stat[0] / (1024 * 1024):.1f} MB")
+            if not has_pil:
+                return
+            if cached is not None and cached[1] == video_stat:
+                enable_storyboard()
+                return
             
-            video_thumb_label.bind("<Double-1>", make_video_click_func())
+            retried = [False]  # 缓存中的截图损坏时只重新提取一次
             
-            # 显示视频信息
-            if os.path.exists(video_path):
-                try:
-                    file_name = os.path.basename(video_path)
-                    file_size = os.path.getsize(video_path)
-                    size_mb = file_size / (1024 * 1024)
-                    
-                    # 尝试获取视频缩略图
-                    thumbnail_path = get_video_thumbnail(video_path)
-                    
-                    if thumbnail_path and os.path.exists(thumbnail_path) and Image and ImageTk:
-                        try:
-                            # 加载缩略图
-                            img = Image.open(thumbnail_path)
-                            # 创建缩略图
-                            img.thumbnail((120, 120))
-                            tk_img = ImageTk.PhotoImage(img)
-                            video_thumb_label.config(image=tk_img, text="")
-                            video_thumb_label.image = tk_img
-                            video_thumbnail_images.append(tk_img)  # 保持引用
-                        except Exception as img_e:
-                            # 缩略图加载失败，显示图标
-                            video_thumb_label.config(text=f"🎬\n{i+1}", font=("微软雅黑", 16))
-                    else:
-                        # 没有缩略图，显示图标
-                        video_thumb_label.config(text=f"🎬\n{i+1}", font=("微软雅黑", 16))
-                    
-                    # 显示文件名和大小
-                    info_text = f"{file_name[:15]}..." if len(file_name) > 15 else file_name
-                    info_text += f"\n{size_mb:.1f} MB"
-                    
-                    info_label = tk.Label(video_thumb_frame, text=info_text, bg="#ffffff", fg="#475569",
-                                         font=("微软雅黑", 8), wraplength=120, justify="center")
-                    info_label.pack(pady=(0, 5))
-                    
-                except Exception as e:
-                    video_thumb_label.config(text=f"❌\n加载失败", fg="#ef4444", font=("微软雅黑", 9))
-            else:
-                video_thumb_label.config(text=f"🎬\n{i+1}", fg="#cbd5e1", font=("微软雅黑", 16))
+            def image_done(img, error):
+                if not video_thumb_label.winfo_exists():
+                    return
+                if error is not None and not retried[0] and not isinstance(error, VideoThumbnailUnavailable):
+                    # 缓存中的截图已被删除，重新提取
+                    retried[0] = True
+                    thumbnail_loader.watch(get_video_thumbnail_service().request(video_path), video_done)
+                    return
+                if error is not None:
+                    # 缩略图加载失败，显示图标
+                    video_thumb_label.config(image="", text=f"🎬\n{strip_index(video_thumb_frame)+1}",
+                                             font=("微软雅黑", 16), width=0, height=0)
+                    video_thumb_label.image = None
+                    return
+                tk_img = ImageTk.PhotoImage(img)
+                photo_image_cache.put(photo_key, tk_img, video_stat)
+                video_thumb_label.config(image=tk_img, text="", width=0, height=0)
+                video_thumb_label.image = tk_img  # 保持引用
+                enable_storyboard()
+            
+            def video_done(thumbnail_path, error):
+                if not video_thumb_label.winfo_exists():
+                    return
+                if error is not None or not thumbnail_path:
+                    # 没有缩略图，显示图标
+                    image_done(None, VideoThumbnailUnavailable(error or "未能提取视频缩略图"))
+                    return
+                # 截图本身就在缓存中，缩小放到后台但不再写入图片缓存
+                thumbnail_loader.submit(decode_video_thumbnail, (thumbnail_path, VIDEO_THUMBNAIL_SIZE), image_done)
+            
+            thumbnail_loader.watch(get_video_thumbnail_service().request(video_path), video_done)
+        
+        thumbnail_loader.submit(stat_cache.stat, (video_path,), stat_done)
+        return video_thumb_frame
+    
+    video_strip = AttachmentStrip(video_thumbnail_scrollable_frame, make_video_tile, "暂无视频", 70)
+    
+    def strip_index(tile):
+        """缩略图当前在视频条中的位置（前面的视频可能已被删除）"""
+        return video_strip.tiles.index(tile) if tile in video_strip.tiles else 0
+    
+    # 加载和显示全部视频缩略图
+    def load_video_thumbnails():
+        video_strip.set_items(video_paths)
     
     # 初始加载视频缩略图
     load_video_thumbnails()
@@ -1345,34 +4504,29 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
             filetypes=[("视频文件", "*.mp4 *.avi *.mov *.mkv *.wmv *.flv *.webm"),
                       ("所有文件", "*.*")]
         )
-        if file_paths:
-            new_video_paths = []
+        if not file_paths:
+            return
+        
+        def video_imported(original_path, copied_path, error):
+            if get_task(task.id) is not task:
+                return  # 导入过程中任务已被删除
+            # 复制失败时与之前一样保留原路径
+            new_path = copied_path or original_path
+            video_paths.append(new_path)
+            task.video_paths = list(video_paths)
+            save_task_change(task, "video_paths")
+            # 更新显示（只为新增的视频创建缩略图）
+            if video_frame.winfo_exists():
+                video_strip.append([new_path])
+        
+        if project_path and os.path.exists(project_path):
+            # 复制文件到项目文件夹
+            attachment_importer.add(file_paths, project_path, "videos", video_imported,
+                                    lambda done, cancelled: show_import_result(video_frame, done, cancelled, "个视频"))
+        else:
             for file_path in file_paths:
-                # 复制文件到项目文件夹
-                if project_path and os.path.exists(project_path):
-                    copied_path = copy_file_to_project(file_path, project_path, "videos")
-                    if copied_path:
-                        new_video_paths.append(copied_path)
-                    else:
-                        new_video_paths.append(file_path)
-                else:
-                    new_video_paths.append(file_path)
-            
-            # 添加到现有视频列表
-            updated_video_paths = video_paths + new_video_paths
-            task_parts = todo_list[index].split("|")
-            task_parts = task_parts + [""] * (7 - len(task_parts))
-            task_parts[4] = join_path_list(updated_video_paths)
-            todo_list[index] = "|".join(task_parts)
-            save_todo()
-            # 更新显示
-            video_paths[:] = updated_video_paths
-            load_video_thumbnails()
-            # 成功提示
-            success_label = tk.Label(video_frame, text=f"✓ 已添加 {len(file_paths)} 个视频到项目文件夹", bg="#d1fae5", fg="#065f46",
-                                    font=("微软雅黑", 9, "bold"), padx=10, pady=5)
-            success_label.place(relx=0.5, rely=0.92, anchor="center")
-            detail_win.after(2000, success_label.destroy)
+                video_imported(file_path, None, None)
+            show_import_result(video_frame, len(file_paths), False, "个视频")
 
     # 删除视频按钮
     def del_video_func():
@@ -1412,18 +4566,16 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
             
             # 删除选中的视频
             selected_indices = sorted(selected_indices, reverse=True)  # 从后往前删除
-            for idx in selected_indices:
-                video_paths.pop(idx)
+            removed_paths = [video_paths.pop(idx) for idx in selected_indices]
             
             # 更新数据
-            task_parts = todo_list[index].split("|")
-            task_parts = task_parts + [""] * (7 - len(task_parts))
-            task_parts[4] = join_path_list(video_paths)
-            todo_list[index] = "|".join(task_parts)
-            save_todo()
+            task.video_paths = list(video_paths)
+            save_task_change(task, "video_paths")
+            # 启用内容存储时释放不再被任何任务使用的附件
+            release_attachments(removed_paths)
             
-            # 更新显示
-            load_video_thumbnails()
+            # 更新显示（只移除被删除视频的缩略图）
+            video_strip.remove(selected_indices)
             del_win.destroy()
             
             # 成功提示
@@ -1486,7 +4638,7 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
             file_btn_frame.pack(fill=tk.X)
         
         # 保存隐藏状态
-        save_hide_state(index, [
+        save_hide_state(task.id, [
             "1" if comment_hidden else "0",
             "1" if img_hidden else "0",
             "1" if video_hidden else "0",
@@ -1565,9 +4717,39 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
         else:
             return "其他"
     
+    file_tree.tag_configure("missing", foreground="#ef4444")
+    file_list_generation = [0]  # 重新加载列表后丢弃上一次后台获取的文件大小
+    
+    # 在列表末尾为 file_paths[start:] 插入行，大小在后台一次性获取；不存在的文件标记为缺失而不是隐藏
+    def append_file_rows(start):
+        if start == 0:
+            # 去掉"暂无文件"的空行
+            for item in file_tree.get_children():
+                file_tree.delete(item)
+        generation = file_list_generation[0]
+        new_paths = file_paths[start:]
+        items = []
+        for i, file_path in enumerate(new_paths, start):
+            file_name = os.path.basename(file_path)
+            file_type = get_file_type(file_name)
+            items.append(file_tree.insert("", tk.END, values=(i+1, file_name, "…", file_type, file_path)))
+        
+        def sizes_done(sizes, error):
+            if error is not None or generation != file_list_generation[0] or not file_tree.winfo_exists():
+                return
+            for item, file_size in zip(items, sizes):
+                if file_size is None:
+                    file_tree.set(item, "大小", "缺失")
+                    file_tree.item(item, tags=("missing",))
+                else:
+                    file_tree.set(item, "大小", f"{file_size / (1024 * 1024):.2f} MB")
+        
+        thumbnail_loader.submit(stat_paths, (new_paths,), sizes_done)
+    
     # 加载文件列表
     def load_file_list():
         # 清空现有列表
+        file_list_generation[0] += 1
         for item in file_tree.get_children():
             file_tree.delete(item)
         
@@ -1576,13 +4758,7 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
             file_tree.insert("", tk.END, values=("", "暂无文件", "", "", ""))
             return
         
-        for i, file_path in enumerate(file_paths):
-            if os.path.exists(file_path):
-                file_name = os.path.basename(file_path)
-                file_size = os.path.getsize(file_path)
-                size_mb = file_size / (1024 * 1024)
-                file_type = get_file_type(file_name)
-                file_tree.insert("", tk.END, values=(i+1, file_name, f"{size_mb:.2f} MB", file_type, file_path))
+        append_file_rows(0)
     
     # 初始加载文件列表
     load_file_list()
@@ -1597,35 +4773,28 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
             title="选择文件", parent=detail_win,
             filetypes=[("所有文件", "*.*")]
         )
-        if file_paths_selected:
-            new_file_paths = []
+        if not file_paths_selected:
+            return
+        
+        def file_imported(original_path, copied_path, error):
+            if get_task(task.id) is not task:
+                return  # 导入过程中任务已被删除
+            # 复制失败时与之前一样保留原路径
+            file_paths.append(copied_path or original_path)
+            task.file_paths = list(file_paths)
+            save_task_change(task, "file_paths")
+            # 更新显示（只为新增的文件插入一行）
+            if file_frame.winfo_exists():
+                append_file_rows(len(file_paths) - 1)
+        
+        if project_path and os.path.exists(project_path):
+            # 复制文件到项目文件夹（按扩展名放入对应子文件夹）
+            attachment_importer.add(file_paths_selected, project_path, None, file_imported,
+                                    lambda done, cancelled: show_import_result(file_frame, done, cancelled, "个文件"))
+        else:
             for file_path in file_paths_selected:
-                # 复制文件到项目文件夹
-                if project_path and os.path.exists(project_path):
-                    file_type = get_file_type_from_extension(file_path)
-                    copied_path = copy_file_to_project(file_path, project_path, file_type)
-                    if copied_path:
-                        new_file_paths.append(copied_path)
-                    else:
-                        new_file_paths.append(file_path)
-                else:
-                    new_file_paths.append(file_path)
-            
-            # 添加到现有文件列表
-            updated_file_paths = file_paths + new_file_paths
-            task_parts = todo_list[index].split("|")
-            task_parts = task_parts + [""] * (7 - len(task_parts))
-            task_parts[5] = join_path_list(updated_file_paths)
-            todo_list[index] = "|".join(task_parts)
-            save_todo()
-            # 更新显示
-            file_paths[:] = updated_file_paths
-            load_file_list()
-            # 成功提示
-            success_label = tk.Label(file_frame, text=f"✓ 已添加 {len(file_paths_selected)} 个文件到项目文件夹", bg="#d1fae5", fg="#065f46",
-                                    font=("微软雅黑", 9, "bold"), padx=10, pady=5)
-            success_label.place(relx=0.5, rely=0.92, anchor="center")
-            detail_win.after(2000, success_label.destroy)
+                file_imported(file_path, None, None)
+            show_import_result(file_frame, len(file_paths_selected), False, "个文件")
 
     # 删除文件按钮
     def del_file_func():
@@ -1652,16 +4821,13 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
         
         # 从后往前删除
         selected_indices = sorted(selected_indices, reverse=True)
-        for idx in selected_indices:
-            if 0 <= idx < len(file_paths):
-                file_paths.pop(idx)
+        removed_paths = [file_paths.pop(idx) for idx in selected_indices if 0 <= idx < len(file_paths)]
         
         # 更新数据
-        task_parts = todo_list[index].split("|")
-        task_parts = task_parts + [""] * (7 - len(task_parts))
-        task_parts[5] = join_path_list(file_paths)
-        todo_list[index] = "|".join(task_parts)
-        save_todo()
+        task.file_paths = list(file_paths)
+        save_task_change(task, "file_paths")
+        # 启用内容存储时释放不再被任何任务使用的附件
+        release_attachments(removed_paths)
         
         # 更新显示
         load_file_list()
@@ -1706,7 +4872,7 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
         btn.bind("<Leave>", on_leave)
         return btn
 
-    close_btn = create_action_button(action_btn_frame, "✅ 完成查看", "#64748b", detail_win.destroy)
+    close_btn = create_action_button(action_btn_frame, "✅ 完成查看", "#64748b", on_detail_window_close)
     close_btn.pack(side=tk.RIGHT)
     
     # 恢复隐藏按钮
@@ -1732,18 +4898,13 @@ def create_detail_window(index, title, status, comment, img_paths, video_paths,
     
     # 标记完成/未完成按钮
     def toggle_status_func():
-        task_parts = todo_list[index].split("|")
-        task_parts = task_parts + [""] * (7 - len(task_parts))
-        new_status = "False" if task_parts[1] == "True" else "True"
-        task_parts[1] = new_status
-        todo_list[index] = "|".join(task_parts)
-        save_todo()
-        update_main_ui()
-        detail_win.destroy()
-        messagebox.showinfo("成功", f"任务已标记为{'已完成' if new_status == 'True' else '未完成'}！", parent=root_window)
+        task.completed = not task.completed
+        save_task_change(task, "completed")
+        on_detail_window_close()
+        messagebox.showinfo("成功", f"任务已标记为{'已完成' if task.completed else '未完成'}！", parent=root_window)
     
-    status_btn_text = "标记为未完成" if status == "True" else "标记为已完成"
-    status_btn_color = "#f97316" if status == "True" else "#10b981"
+    status_btn_text = "标记为未完成" if completed else "标记为已完成"
+    status_btn_color = "#f97316" if completed else "#10b981"
     status_btn = create_action_button(action_btn_frame, status_btn_text, status_btn_color, toggle_status_func)
     status_btn.pack(side=tk.RIGHT, padx=(0, 10))
 
@@ -1759,32 +4920,23 @@ def add_todo():
         # 获取当前时间（精确到日）
         current_time = datetime.datetime.now().strftime("%Y-%m-%d")
         
-        # 创建新任务（7个字段，第7个是项目文件夹路径），在标题后添加时间
+        # 创建新任务（自动分配任务ID），在标题后添加时间
         task_title_with_time = f"{task_content.strip()} ({current_time})"
-        new_task = f"{task_title_with_time}|False|||||"
-        todo_list.append(new_task)
-        
-        # 获取任务索引
-        task_index = len(todo_list) - 1
+        new_task = Task(title=task_title_with_time)
         
         # 创建项目文件夹（使用原始标题，不含时间）
-        project_path = create_project_folder(task_index, task_content.strip())
+        project_path = create_project_folder(new_task.id, task_content.strip())
         
         if project_path:
             # 更新任务数据，添加项目文件夹路径
-            task_parts = new_task.split("|")
-            task_parts = task_parts + [""] * (7 - len(task_parts))
-            task_parts[6] = project_path
-            todo_list[task_index] = "|".join(task_parts)
+            new_task.project_path = project_path
             
-            # 保存数据
-            save_todo()
-            update_main_ui()
+            # 保存数据（主界面通过变更通知更新）
+            insert_task(new_task)
             messagebox.showinfo("成功", f"✅ 任务「{task_content.strip()}」添加成功！\n添加时间：{current_time}\n项目文件夹已创建：{project_path}", parent=root_window)
         else:
             # 项目文件夹创建失败，但仍然保存任务
-            save_todo()
-            update_main_ui()
+            insert_task(new_task)
             messagebox.showwarning("警告", f"任务「{task_content.strip()}」添加成功，但项目文件夹创建失败。\n添加时间：{current_time}", parent=root_window)
             
     except Exception as e:
@@ -1807,32 +4959,23 @@ def delete_todo():
             return
         if 0 <= index < len(todo_list):
             # 获取任务数据
-            task_parts = todo_list[index].split("|")
-            task_parts = task_parts + [""] * (7 - len(task_parts))
-            title = task_parts[0]
-            project_path = task_parts[6]  # 第7个字段是项目文件夹路径
+            task = todo_list[index]
+            title = task.title
+            project_path = task.project_path
             
-            # 删除项目文件夹（如果存在）
-            folder_deleted = False
-            if project_path and os.path.exists(project_path):
-                try:
-                    import shutil
-                    shutil.rmtree(project_path)
-                    folder_deleted = True
-                except Exception as folder_e:
-                    print(f"删除项目文件夹失败: {folder_e}")
-                    # 继续删除任务，即使文件夹删除失败
+            # 释放由内容存储管理的附件（其他任务仍在使用的内容会保留）
+            release_attachments(task.img_paths + task.video_paths + task.file_paths)
             
             # 删除任务
-            todo_list.pop(index)
-            save_todo()
-            update_main_ui()
+            remove_task(task)
             
-            # 显示成功消息
-            if folder_deleted:
-                messagebox.showinfo("成功", f"✅ 任务「{title}」已删除！\n项目文件夹也已删除：{project_path}", parent=root_window)
-            else:
-                messagebox.showinfo("成功", f"✅ 任务「{title}」已删除！", parent=root_window)
+            # 在后台停止附件导入并删除项目文件夹（如果存在），完成后显示结果
+            def on_files_deleted(folder_deleted):
+                if folder_deleted:
+                    messagebox.showinfo("成功", f"✅ 任务「{title}」已删除！\n项目文件夹也已删除：{project_path}", parent=root_window)
+                else:
+                    messagebox.showinfo("成功", f"✅ 任务「{title}」已删除！", parent=root_window)
+            delete_task_files(task, on_files_deleted)
         else:
             messagebox.showerror("错误", "序号不存在！", parent=root_window)
     except Exception as e:
@@ -1854,8 +4997,8 @@ def edit_todo():
             messagebox.showerror("错误", "请输入有效的数字序号！", parent=root_window)
             return
         if 0 <= index < len(todo_list):
-            old_parts = todo_list[index].split("|")
-            old_title_with_time = old_parts[0] if len(old_parts)>=1 else "无标题任务"
+            task = todo_list[index]
+            old_title_with_time = task.title if task.title else "无标题任务"
             
             # 从标题中提取原始标题（去掉时间部分）
             # 假设时间格式为 "标题 (YYYY-MM-DD)"
@@ -1878,10 +5021,8 @@ def edit_todo():
                 current_time = datetime.datetime.now().strftime("%Y-%m-%d")
                 new_title_with_time = f"{new_title.strip()} ({current_time})"
             
-            old_parts[0] = new_title_with_time
-            todo_list[index] = "|".join(old_parts)
-            save_todo()
-            update_main_ui()
+            task.title = new_title_with_time
+            save_task_change(task, "title")
             messagebox.showinfo("成功", "✅ 任务标题已修改！", parent=root_window)
         else:
             messagebox.showerror("错误", "序号不存在！", parent=root_window)
@@ -1904,14 +5045,10 @@ def complete_todo():
             messagebox.showerror("错误", "请输入有效的数字序号！", parent=root_window)
             return
         if 0 <= index < len(todo_list):
-            parts = todo_list[index].split("|")
-            parts = parts + [""] * (6 - len(parts))
-            new_status = "True" if parts[1] == "False" else "False"
-            parts[1] = new_status
-            todo_list[index] = "|".join(parts)
-            save_todo()
-            update_main_ui()
-            status_text = "已完成" if new_status=="True" else "未完成"
+            task = todo_list[index]
+            task.completed = not task.completed
+            save_task_change(task, "completed")
+            status_text = "已完成" if task.completed else "未完成"
             messagebox.showinfo("成功", f"✅ 任务已标记为{status_text}！", parent=root_window)
         else:
             messagebox.showerror("错误", "序号不存在！", parent=root_window)
@@ -1946,14 +5083,17 @@ def exit_app():
     try:
         if messagebox.askyesno("退出", "确定退出？所有任务会自动保存", parent=root_window):
             save_todo()
+            flush_hide_states()
+            flush_blob_store()
             save_window_config()
+            shutdown_thumbnail_workers()
             root_window.destroy()
     except Exception as e:
         messagebox.showerror("错误", f"退出失败：{str(e)}", parent=root_window)
 
 # -------------------------- 首页UI --------------------------
 def create_main_ui():
-    global root_window, task_text_widget, todo_list
+    global root_window, task_list_view, task_count_label, todo_list
     # 初始化全局变量
     root_window = tk.Tk()
     root_window.title("KP项目管理")
@@ -1977,10 +5117,18 @@ def create_main_ui():
                            font=("微软雅黑", 24, "bold"))
     title_label.pack(expand=True)
     
+    # 搜索栏
+    create_search_bar(root_window)
+    
     # 任务显示区
     task_container = tk.Frame(root_window, bg="#f5f5f5", padx=15, pady=15)
     task_container.pack(fill=tk.BOTH, expand=True)
     
+    # 任务计数（来自状态索引，无需遍历任务）
+    task_count_label = tk.Label(task_container, text="", bg="#f5f5f5", fg="#666666",
+                                font=("微软雅黑", 10), anchor="e")
+    task_count_label.pack(fill=tk.X, pady=(0, 5))
+    
     task_card = tk.Frame(task_container, bg="#ffffff", bd=0, 
                          highlightbackground="#e0e0e0", highlightthickness=1)
     task_card.pack(fill=tk.BOTH, expand=True)
@@ -1988,12 +5136,12 @@ def create_main_ui():
     task_scrollbar = tk.Scrollbar(task_card, bg="#f5f5f5", width=12, bd=0)
     task_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
     
-    task_text_widget = tk.Text(task_card, bg="#ffffff", fg="#333333",
-                        font=("微软雅黑", 12), wrap=tk.WORD,
-                        yscrollcommand=task_scrollbar.set,
-                        bd=0, padx=20, pady=20)
-    task_text_widget.pack(fill=tk.BOTH, expand=True)
-    task_scrollbar.config(command=task_text_widget.yview)
+    task_list_view = VirtualTaskList(task_card, task_scrollbar, on_task_row_click)
+    task_list_view.pack(fill=tk.BOTH, expand=True)
+    subscribe_task_changes(on_task_model_change)
+    
+    # 启动一段时间后在后台清理不再引用的缩略图缓存
+    root_window.after(THUMBNAIL_SWEEP_DELAY, sweep_thumbnail_caches)
     
     # 底部容器（包含功能按钮区和退出按钮）
     bottom_container = tk.Frame(root_window, bg="#f5f5f5")
@@ -2141,8 +5289,11 @@ def create_main_ui():
     def on_window_close():
         # 保存窗口配置
         save_window_config()
-        # 保存待办数据
+        # 保存待办数据和隐藏状态
         save_todo()
+        flush_hide_states()
+        flush_blob_store()
+        shutdown_thumbnail_workers()
         # 销毁窗口
         root_window.destroy()
     
@@ -2154,6 +5305,17 @@ def create_main_ui():
 
 # -------------------------- 程序入口 --------------------------
 if __name__ == "__main__":
+    # python kp.py --bench-thumbs 图片文件夹：比较各缩略图解码模式的速度
+    if len(sys.argv) >= 3 and sys.argv[1] == "--bench-thumbs":
+        if not Image:
+            print("未安装Pillow库！请执行 pip install pillow")
+        else:
+            benchmark_thumbnail_decode(sys.argv[2])
+        sys.exit(0)
+    # python kp.py --bench-video 视频文件或文件夹 [秒数]：比较各视频截图方式的速度
+    if len(sys.argv) >= 3 and sys.argv[1] == "--bench-video":
+        benchmark_video_extract(sys.argv[2], float(sys.argv[3]) if len(sys.argv) >= 4 else 1)
+        sys.exit(0)
     try:
         create_main_ui()
     except Exception as e: